@@ -0,0 +1,112 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from metrics import metrics
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", question.lower()).strip().rstrip("?!. ")
+
+
+class CachedAnswer:
+    def __init__(self, answer: str, scope: str, version: str, embedding: Optional[np.ndarray]):
+        self.answer = answer
+        self.scope = scope
+        self.version = version
+        self.embedding = embedding
+        self.created = time.time()
+
+
+class AnswerCache:
+    """Two-tier cache of generated answers shared by all sessions.
+
+    The first tier matches the normalized question exactly; the second
+    compares query embeddings and accepts the closest cached question above
+    a similarity threshold. Entries belong to a scope (the vector store they
+    were answered from) and that store's version, and are dropped as soon
+    as a lookup sees a newer version of the same scope.
+    """
+
+    def __init__(self, max_entries: int = ANSWER_CACHE_SIZE, ttl: float = ANSWER_CACHE_TTL,
+                 similarity_threshold: float = ANSWER_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[tuple, CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _embed(self, question: str, embed_query: Optional[Callable[[str], List[float]]]) -> Optional[np.ndarray]:
+        if embed_query is None:
+            return None
+        vector = np.asarray(embed_query(question), dtype=np.float32)
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def _expire(self, scope: str, version: str):
+        """Drop entries past their TTL or answered from an older version of scope"""
+        now = time.time()
+        for key, entry in list(self._entries.items()):
+            if now - entry.created > self.ttl or (entry.scope == scope and entry.version != version):
+                del self._entries[key]
+
+    def get(self, question: str, scope: str, version: str,
+            embed_query: Optional[Callable[[str], List[float]]] = None) -> Optional[str]:
+        """Cached answer for question, or None"""
+        normalized = normalize_question(question)
+        with metrics.timer("answer_cache.lookup"):
+            with self._lock:
+                self._expire(scope, version)
+                entry = self._entries.get((scope, normalized))
+                if entry is not None:
+                    self._entries.move_to_end((scope, normalized))
+                    metrics.increment("answer_cache.exact_hits")
+                    return entry.answer
+                candidates = [(key, e) for key, e in self._entries.items()
+                              if e.scope == scope and e.embedding is not None]
+
+            if embed_query is None or not candidates:
+                metrics.increment("answer_cache.misses")
+                return None
+
+            query = self._embed(normalized, embed_query)
+            similarities = np.stack([e.embedding for _, e in candidates]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                metrics.increment("answer_cache.misses")
+                return None
+
+            key, entry = candidates[best]
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            metrics.increment("answer_cache.semantic_hits")
+            return entry.answer
+
+    def put(self, question: str, scope: str, version: str, answer: str,
+            embed_query: Optional[Callable[[str], List[float]]] = None):
+        """Store an answer, evicting the least recently used entry if full"""
+        normalized = normalize_question(question)
+        entry = CachedAnswer(answer, scope, version, self._embed(normalized, embed_query))
+        with self._lock:
+            self._entries[(scope, normalized)] = entry
+            self._entries.move_to_end((scope, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment("answer_cache.evictions")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,72 +1,405 @@
 import streamlit as st
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import Chroma
-from langchain.chains import RetrievalQA
-import PyPDF2
 import tempfile
-from typing import List
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional
+from context_builder import CONTEXT_CANDIDATES, build_context
+from conversation import HISTORY_PAGE_SIZE, ConversationHistory, is_follow_up
+from ingestion import (
+    EMBED_BATCH_SIZE,
+    PendingFile,
+    hash_bytes,
+    hash_text,
+    iter_batches,
+    iter_pdf_pages,
+    read_pdf_bytes,
+)
+from metrics import metrics
+from namespaces import (
+    SHARED,
+    is_session_namespace,
+    list_namespaces,
+    namespace_directory,
+    new_session_namespace,
+    open_namespace,
+    touch,
+)
+from snapshot import SnapshotMismatch, configured_snapshot
+from tokens import estimate_tokens
+from resources import (
+    get_answer_cache,
+    get_embeddings,
+    get_llm,
+    get_llm_gateway,
+    get_manifest,
+    get_snapshot_store,
+    get_vector_store,
+    registry,
+    reload_vector_stores,
+    store_generation,
+    warm_up,
+)
+
+# LangChain, PyPDF2 and the models are imported on first use so the page
+# renders without waiting for them
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+PERSIST_DIRECTORY = os.getenv("PERSIST_DIRECTORY", "./chroma_db")
 
 class CodingChatbot:
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
+    def __init__(self, persist_directory: str = PERSIST_DIRECTORY, embedding_backend: str = None,
+                 vector_backend: str = None, snapshot_directory: Optional[str] = None):
+        """persist_directory holds the shared collection. snapshot_directory,
+        by default the one SNAPSHOT_DIRECTORY points at, is served read-only
+        as the shared collection instead; pass "" to ingest into it.
+        use_collections() switches to namespaced collections."""
+        self.embedding_backend = embedding_backend
+        self.vector_backend = vector_backend
+        self.base_directory = persist_directory
+        self.snapshot_directory = configured_snapshot() if snapshot_directory is None else snapshot_directory
+        # Where uploads go, and every collection answers are drawn from
+        self.write_namespace = None
+        self.persist_directory = self.shared_directory
+        self.search_directories = [self.persist_directory]
+        # Models, the vector stores and the manifests are shared by every session
+        self.manifest = get_manifest(self.persist_directory)
+        self._text_splitter = None
+        self._llm = None
+        self._llm_loaded = False
+        self.vector_store = None
+        self.qa_chain = None
+        # Corpus version the QA chain was built against, and the store
+        # generations the vector store was opened at
+        self.corpus_version = None
+        self.store_generations = None
+        self.last_time_to_first_token = None
+        self.last_input_tokens = None
+        self.last_trace = None
+        # Sources whose extraction failed in the current process_pdfs run,
+        # and source -> file hash of those read without errors
+        self.failed_sources = set()
+        self.extracted_files = {}
+    
+    @property
+    def embeddings(self):
+        """Shared embedding model, loaded on the first ingest or query"""
+        return get_embeddings(backend=self.embedding_backend)
+    
+    @property
+    def answer_cache(self):
+        return get_answer_cache()
+    
+    @property
+    def text_splitter(self):
+        if self._text_splitter is None:
+            from langchain.text_splitter import RecursiveCharacterTextSplitter
+            self._text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=1000,
+                chunk_overlap=200,
+                length_function=len
+            )
+        return self._text_splitter
+    
+    @property
+    def llm(self):
+        """Gemini client, created on first use"""
+        if not self._llm_loaded:
+            self.setup_llm()
+        return self._llm
+    
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+        self._llm_loaded = True
+    
+    @property
+    def llm_gateway(self):
+        """Shared front for self.llm that all sessions' requests go through"""
+        return get_llm_gateway(self.llm)
+    
+    @property
+    def shared_directory(self) -> str:
+        return self.snapshot_directory or self.base_directory
+    
+    def collection_directory(self, name: str) -> str:
+        """Directory of the shared collection or of a namespace such as course/cs101"""
+        return self.shared_directory if name == SHARED else namespace_directory(name)
+    
+    def use_collections(self, write: str, search: Iterable[str] = ()):
+        """Upload into collection write; answer from it and the collections in search"""
+        persist_directory = self.collection_directory(write)
+        search_directories = list(dict.fromkeys(
+            [persist_directory] + [self.collection_directory(name) for name in search]
+        ))
+        if (persist_directory, search_directories) == (self.persist_directory, self.search_directories):
+            return
+        self.write_namespace = None if write == SHARED else write
+        self.persist_directory = persist_directory
+        self.search_directories = search_directories
+        self.manifest = get_manifest(persist_directory)
         self.vector_store = None
         self.qa_chain = None
-        self.setup_llm()
+    
+    def search_version(self) -> str:
+        """Version of the searched collections taken together"""
+        versions = [get_manifest(directory).version for directory in self.search_directories]
+        return versions[0] if len(versions) == 1 else hash_text("".join(versions))[:16]
+    
+    def current_generations(self):
+        return tuple(store_generation(directory) for directory in self.search_directories)
+    
+    def refresh_corpus(self):
+        """Drop the QA chain if the corpus changed since it was built.
+        
+        Picks up uploads from other sessions, collections written by
+        another process such as ingest_cli.py and stores rebuilt by
+        compaction, without a restart. Also keeps the searched session
+        namespaces from expiring.
+        """
+        for directory in self.search_directories:
+            touch(directory)
+            if get_manifest(directory).reload_if_changed():
+                reload_vector_stores(directory)
+        if self.vector_store is not None and self.store_generations != self.current_generations():
+            self.vector_store = None
+            self.qa_chain = None
+        elif self.qa_chain is not None and self.corpus_version != self.search_version():
+            # A collection that was empty may have to join the search
+            self.vector_store = None
+            self.qa_chain = None
+    
+    def ensure_qa_chain(self):
+        """Reuse the corpus other sessions or ingest_cli.py have already ingested"""
+        self.refresh_corpus()
+        if self.qa_chain is None and any(get_manifest(d).files for d in self.search_directories):
+            self.load_vector_store()
+            self.setup_qa_chain()
     
     def setup_llm(self):
         """Initialize the Gemini LLM"""
         try:
             # Initialize the ChatGoogleGenerativeAI model
-            self.llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", google_api_key=st.secrets["GEMINI_API_KEY"])
+            self.llm = get_llm(st.secrets["GEMINI_API_KEY"])
         except Exception as e:
             st.error(f"Error loading model: {e}")
             self.llm = None
     
     def extract_text_from_pdf(self, pdf_file) -> str:
         """Extract text from uploaded PDF"""
-        text = ""
+        import PyPDF2
+        pages = []
+        with metrics.span("pdf.extract"):
+            try:
+                pdf_reader = PyPDF2.PdfReader(pdf_file)
+                for page in pdf_reader.pages:
+                    pages.append(page.extract_text())
+            except Exception as e:
+                st.error(f"Error reading PDF: {e}")
+        return "".join(pages)
+    
+    def process_pdfs(self, pdf_files, max_workers: Optional[int] = None,
+                     on_error: Optional[Callable[[str, str], None]] = None) -> Iterator["Document"]:
+        """Process multiple PDF files and yield text chunks.
+        
+        Files whose content hash is already in the manifest are skipped, so
+        re-uploading the same material does no extraction or embedding work.
+        So are new files already ingested into another searched collection,
+        such as a textbook in the shared one uploaded again into a session.
+        Pages are extracted in a process pool and split as they arrive; each
+        chunk keeps its source file and page number as metadata.
+        Read errors are shown in the page unless on_error(source, message)
+        is given; a file with errors is not recorded as ingested, so it is
+        retried next time.
+        """
+        from langchain.schema import Document
+        on_error = on_error or (lambda source, error: st.error(f"Error reading PDF {source}: {error}"))
+        self.failed_sources = set()
+        self.extracted_files = {}
+        
+        def report(source: str, error: str):
+            self.failed_sources.add(source)
+            on_error(source, error)
+        
+        def extracted(pending_file: PendingFile):
+            self.extracted_files[pending_file.source] = pending_file.file_hash
+        
+        pending_files = []
         try:
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        except Exception as e:
-            st.error(f"Error reading PDF: {e}")
-        return text
-    
-    def process_pdfs(self, pdf_files) -> List[str]:
-        """Process multiple PDF files and return text chunks"""
-        all_text = ""
-        for pdf_file in pdf_files:
-            text = self.extract_text_from_pdf(pdf_file)
-            all_text += f"\n\n--- {pdf_file.name} ---\n\n{text}"
-        
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(all_text)
-        return chunks
-    
-    def create_vector_store(self, text_chunks: List[str]):
-        """Create vector store from text chunks"""
-        if text_chunks:
-            self.vector_store = Chroma.from_texts(
-                texts=text_chunks,
-                embedding=self.embeddings,
-                persist_directory="./chroma_db"
+            for pdf_file in pdf_files:
+                data = read_pdf_bytes(pdf_file)
+                file_hash = hash_bytes(data)
+                if (self.manifest.is_current(pdf_file.name, file_hash)
+                        or self.searchable_elsewhere(pdf_file.name, file_hash)):
+                    continue
+                with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+                    f.write(data)
+                pending_files.append(PendingFile(pdf_file.name, file_hash, f.name))
+                del data
+            
+            pages = iter_pdf_pages(
+                pending_files,
+                max_workers=max_workers,
+                on_error=report,
+                on_file_done=extracted
             )
-            self.vector_store.persist()
+            for page in pages:
+                with metrics.span("split_text"):
+                    chunks = self.text_splitter.split_text(page.text)
+                for chunk in chunks:
+                    yield Document(
+                        page_content=chunk,
+                        metadata={"source": page.source, "file_hash": page.file_hash, "page": page.page}
+                    )
+        finally:
+            for pending_file in pending_files:
+                os.unlink(pending_file.path)
+    
+    def searchable_elsewhere(self, source: str, file_hash: str) -> bool:
+        """True if source is new to the write collection but a searched collection already holds its content"""
+        if source in self.manifest.files:
+            # Its older version has to be replaced where it is
+            return False
+        return any(get_manifest(directory).has_file_hash(file_hash)
+                   for directory in self.search_directories if directory != self.persist_directory)
+    
+    def load_vector_store(self):
+        """Open the searched collections if they are not open yet.
+        
+        Several non-empty collections are searched through one combined
+        view, so each query only touches the collections this session uses.
+        """
+        if self.vector_store is None:
+            from vector_index import CombinedVectorStore
+            self.store_generations = self.current_generations()
+            stores = [self.open_store(d) for d in list(self.search_directories) if get_manifest(d).files]
+            if not stores:
+                stores = [self.open_store(self.persist_directory)]
+            self.vector_store = stores[0] if len(stores) == 1 else CombinedVectorStore(stores)
+        return self.vector_store
+    
+    def open_store(self, directory: str):
+        """Shared store of one collection.
+        
+        A snapshot embedded with another model than ours is not used; the
+        writable persist directory takes its place.
+        """
+        if directory == self.snapshot_directory:
+            try:
+                return get_snapshot_store(directory, backend=self.embedding_backend)
+            except SnapshotMismatch as e:
+                st.error(f"Ignoring snapshot {directory}: {e}")
+                self.drop_snapshot()
+                directory = self.base_directory
+        return get_vector_store(directory, backend=self.embedding_backend, vector_backend=self.vector_backend)
+    
+    def drop_snapshot(self):
+        snapshot_directory, self.snapshot_directory = self.snapshot_directory, ""
+        if self.persist_directory == snapshot_directory:
+            self.persist_directory = self.base_directory
+            self.manifest = get_manifest(self.base_directory)
+        self.search_directories = [
+            self.base_directory if directory == snapshot_directory else directory
+            for directory in self.search_directories
+        ]
+        self.qa_chain = None
+    
+    def create_vector_store(self, text_chunks: Iterable["Document"]):
+        """Add text chunks to the persisted vector store.
+        
+        Chunks are consumed in batches, so embedding starts while later pages
+        are still being parsed. They are stored under the hash of their text,
+        so chunks that are already present are not embedded again. When a
+        file changed, the chunks it no longer produces are deleted.
+        """
+        if self.persist_directory == self.snapshot_directory:
+            st.error("The shared collection is a read-only snapshot; add uploads to another collection.")
+            return
+        if self.write_namespace:
+            open_namespace(self.write_namespace)
+        with metrics.trace("ingest") as trace:
+            self.last_trace = trace
+            # Opened under the lock, so compaction cannot swap the files in between
+            with registry.lock(self.persist_directory):
+                self._ingest(self.open_store(self.persist_directory), text_chunks)
+            self.vector_store = None
+            self.load_vector_store()
+    
+    def _ingest(self, vector_store, text_chunks: Iterable["Document"]):
+        """Stream chunks into the store; callers hold the store's write lock"""
+        from langchain.schema import Document
+        # source -> (file_hash, chunk ids) for files whose chunks are still arriving
+        open_sources = OrderedDict()
+        seen_sources = set()
+        for batch in iter_batches(text_chunks, EMBED_BATCH_SIZE):
+            batch_chunks = OrderedDict()
+            source = None
+            for chunk in batch:
+                if isinstance(chunk, str):
+                    chunk = Document(page_content=chunk, metadata={})
+                chunk_id = hash_text(chunk.page_content)
+                batch_chunks.setdefault(chunk_id, chunk)
+                source = chunk.metadata.get("source")
+                if source is not None:
+                    seen_sources.add(source)
+                    open_sources.setdefault(source, (chunk.metadata["file_hash"], []))[1].append(chunk_id)
+            
+            self._add_new_chunks(vector_store, batch_chunks)
+            
+            # Chunks arrive in file order, so every file but the last one seen is complete
+            for finished in [s for s in open_sources if s != source]:
+                self._finish_source(vector_store, finished, *open_sources.pop(finished))
+        
+        for finished, (file_hash, chunk_ids) in open_sources.items():
+            self._finish_source(vector_store, finished, file_hash, chunk_ids)
+        # Files without any text, such as scanned PDFs, are checkpointed too, so
+        # they are not extracted again and the chunks of an older version go
+        for finished, file_hash in self.extracted_files.items():
+            if finished not in seen_sources:
+                self._finish_source(vector_store, finished, file_hash, [])
+        self.extracted_files = {}
+        
+        vector_store.persist()
+    
+    def _add_new_chunks(self, vector_store, chunks: "OrderedDict[str, Document]"):
+        """Embed and store the chunks whose ids are not in the store yet"""
+        chunk_ids = list(chunks)
+        existing_ids = set(vector_store.get(ids=chunk_ids, include=[])["ids"])
+        new_ids = [chunk_id for chunk_id in chunk_ids if chunk_id not in existing_ids]
+        if new_ids:
+            with metrics.span("vector_store.add"):
+                vector_store.add_texts(
+                    texts=[chunks[chunk_id].page_content for chunk_id in new_ids],
+                    metadatas=[chunks[chunk_id].metadata for chunk_id in new_ids],
+                    ids=new_ids
+                )
+    
+    def _finish_source(self, vector_store, source: str, file_hash: str, chunk_ids: List[str]):
+        """Drop chunks a file no longer produces and checkpoint it in the manifest"""
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        if source in self.failed_sources:
+            # Only part of the file was read: keep its previous chunks and
+            # manifest entry, and drop the partial chunks nothing refers to
+            referenced = self.manifest.referenced_ids()
+            orphan_ids = [chunk_id for chunk_id in chunk_ids if chunk_id not in referenced]
+            if orphan_ids:
+                vector_store.delete(ids=orphan_ids)
+                self.manifest.record_deleted(len(orphan_ids))
+            return
+        stale_ids = self.manifest.stale_ids(source, chunk_ids)
+        if stale_ids:
+            vector_store.delete(ids=stale_ids)
+            self.manifest.record_deleted(len(stale_ids))
+        self.manifest.record(source, file_hash, chunk_ids)
+        self.manifest.save()
     
     def setup_qa_chain(self):
         """Setup the question-answering chain"""
-        if self.vector_store and self.llm:
+        if self.vector_store is not None and self.llm:
+            from langchain.chains import RetrievalQA
             retriever = self.vector_store.as_retriever(
-                search_kwargs={"k": 3}
+                search_kwargs={"k": CONTEXT_CANDIDATES}
             )
             
             self.qa_chain = RetrievalQA.from_chain_type(
@@ -75,40 +408,210 @@ class CodingChatbot:
                 retriever=retriever,
                 return_source_documents=True
             )
+            self.corpus_version = self.search_version()
     
-    def get_coding_prompt(self, question: str) -> str:
+    def get_coding_prompt(self, question: str, history: str = "") -> str:
         """Enhanced prompt for coding-specific responses"""
-        coding_prompt = f"""
-        You are a specialized coding tutor assistant. Answer the following coding question
-        based on the provided context. If the question involves code:
-        
-        1. Provide clear, well-commented code examples
-        2. Explain the logic step by step
-        3. Mention best practices and potential pitfalls
-        4. Include multiple programming languages if relevant
-        5. Reference the training materials when applicable
+        if history:
+            # Earlier turns let follow-up questions such as "why?" be answered
+            question = f"{question}\n\nConversation so far, for reference:\n{history}"
+        # Kept free of indentation, which would otherwise be sent as tokens on every call
+        coding_prompt = (
+            "You are a coding tutor. Answer the coding question using the context. If it involves code: "
+            "give clear, commented examples; explain the logic step by step; mention best practices and "
+            "pitfalls; cover other languages if relevant; reference the training materials when applicable.\n\n"
+            f"Question: {question}"
+        )
+        return coding_prompt
+    
+    def answer_cache_scope(self):
+        """Scope and version that cached answers for this session belong to"""
+        if self.qa_chain:
+            return "|".join(self.search_directories), self.search_version()
+        return "llm", ""
+    
+    def retrieve(self, query: str) -> List["Document"]:
+        """Documents the QA chain's retriever returns for query"""
+        with metrics.span("retrieval"):
+            return self.qa_chain.retriever.get_relevant_documents(query)
+    
+    def build_context(self, question: str) -> List["Document"]:
+        """Retrieved chunks merged, deduplicated and cut to CONTEXT_TOKEN_BUDGET"""
+        docs = self.retrieve(question)
+        with metrics.span("context.build"):
+            context = build_context(docs)
+        metrics.annotate("context_chunks", len(docs))
+        metrics.annotate("context_passages", len(context))
+        return context
+    
+    def count_input_tokens(self, prompt) -> int:
+        """Record the estimated size of a prompt string or PromptValue sent to the LLM"""
+        self.last_input_tokens = estimate_tokens(prompt if isinstance(prompt, str) else prompt.to_string())
+        metrics.increment("llm.requests")
+        metrics.increment("llm.input_tokens", self.last_input_tokens)
+        metrics.annotate("input_tokens", self.last_input_tokens)
+        return self.last_input_tokens
+    
+    def answer_question(self, question: str, history: str = "") -> str:
+        """Generate answer to user question.
         
-        Question: {question}
+        history is the recent conversation as prompt text, already cut to
+        a token budget (see ConversationHistory.context). It is only sent
+        with follow-up questions; other questions are answered, and cached,
+        as if they opened the conversation.
+        """
+        with metrics.trace("answer") as trace:
+            self.last_trace = trace
+            try:
+                self.ensure_qa_chain()
+                scope, version = self.answer_cache_scope()
+                history = self.follow_up_history(question, history)
+                if not history:
+                    cached = self.answer_cache.get(question, scope, version, embed_query=self.embeddings.embed_query)
+                    if cached is not None:
+                        return cached
+                
+                if self.qa_chain:
+                    # Use the QA chain's prompt with the budgeted context; retrieval
+                    # and generation are run as separate steps so each gets a span
+                    prompt = self.build_qa_prompt(question, history)
+                elif self.llm:
+                    # Otherwise, use the LLM directly for general questions
+                    prompt = self.with_history(question, history)
+                else:
+                    return "The language model is not available. Please check your API key."
+                
+                self.count_input_tokens(prompt)
+                with metrics.span("llm"):
+                    answer = self.llm_gateway.invoke(prompt).content
+                
+                if not history:
+                    self.answer_cache.put(question, scope, version, answer, embed_query=self.embeddings.embed_query)
+                return answer
+            except Exception as e:
+                return f"Error generating response: {e}"
+    
+    @staticmethod
+    def follow_up_history(question: str, history: str) -> str:
+        """history if question may refer to it, else "" so the answer can be cached"""
+        if not history:
+            return history
+        if is_follow_up(question):
+            metrics.increment("answer_cache.follow_ups")
+            return history
+        return ""
+    
+    @staticmethod
+    def with_history(question: str, history: str = "") -> str:
+        """Question for the bare LLM, preceded by the conversation so far"""
+        if not history:
+            return question
+        return f"Conversation so far:\n{history}\n\nQuestion: {question}"
+    
+    def build_qa_prompt(self, question: str, history: str = ""):
+        """Retrieve context and fill the QA chain's prompt, as the stuff chain would.
         
-        Provide a comprehensive answer focusing on coding concepts and practical implementation.
+        Retrieval uses the bare question, so the instructions wrapped
+        around it do not pull every query towards the same chunks.
         """
-        return coding_prompt
+        docs = self.build_context(question)
+        return self.qa_chain.combine_documents_chain.llm_chain.prompt.format_prompt(
+            context="\n\n".join(doc.page_content for doc in docs),
+            question=self.get_coding_prompt(question, history)
+        )
     
-    def answer_question(self, question: str) -> str:
-        """Generate answer to user question"""
-        try:
-            if self.qa_chain:
-                # Use the QA chain if it has been initialized
-                enhanced_question = self.get_coding_prompt(question)
-                result = self.qa_chain({"query": enhanced_question})
-                return result["result"]
-            elif self.llm:
-                # Otherwise, use the LLM directly for general questions
-                return self.llm.invoke(question).content
-            else:
-                return "The language model is not available. Please check your API key."
-        except Exception as e:
-            return f"Error generating response: {e}"
+    def stream_answer(self, question: str, history: str = "") -> Iterator[str]:
+        """Generate answer to user question, yielding tokens as they arrive"""
+        start = time.perf_counter()
+        self.last_time_to_first_token = None
+        with metrics.trace("answer") as trace:
+            self.last_trace = trace
+            try:
+                self.ensure_qa_chain()
+                scope, version = self.answer_cache_scope()
+                history = self.follow_up_history(question, history)
+                if not history:
+                    cached = self.answer_cache.get(question, scope, version, embed_query=self.embeddings.embed_query)
+                    if cached is not None:
+                        self._record_first_token(start)
+                        yield cached
+                        return
+                
+                if self.qa_chain:
+                    prompt = self.build_qa_prompt(question, history)
+                elif self.llm:
+                    prompt = self.with_history(question, history)
+                else:
+                    yield "The language model is not available. Please check your API key."
+                    return
+                
+                self.count_input_tokens(prompt)
+                # The span includes the time the caller takes to render each token
+                tokens = []
+                with metrics.span("llm"):
+                    for chunk in self.llm_gateway.stream(prompt):
+                        if not chunk.content:
+                            continue
+                        if not tokens:
+                            self._record_first_token(start)
+                        tokens.append(chunk.content)
+                        yield chunk.content
+                
+                if not history:
+                    self.answer_cache.put(question, scope, version, "".join(tokens), embed_query=self.embeddings.embed_query)
+            except Exception as e:
+                yield f"Error generating response: {e}"
+    
+    def _record_first_token(self, start: float):
+        self.last_time_to_first_token = time.perf_counter() - start
+        metrics.observe("llm.time_to_first_token", self.last_time_to_first_token)
+
+def gemini_api_key():
+    """GEMINI_API_KEY from the Streamlit secrets, or None if there are none"""
+    try:
+        return st.secrets.get("GEMINI_API_KEY")
+    except Exception:
+        return None
+
+def show_history(history: ConversationHistory, key: str):
+    """Render the newest page of messages, with a button to page further back"""
+    pages_key = f"{key}_pages"
+    pages = st.session_state.setdefault(pages_key, 1)
+    shown = history.tail(pages * HISTORY_PAGE_SIZE)
+    hidden = len(history) - len(shown)
+    if hidden:
+        if len(shown) < len(history.messages):
+            if st.button(f"Show earlier messages ({hidden} hidden)", key=f"{key}_more"):
+                st.session_state[pages_key] = pages + 1
+                st.rerun()
+        else:
+            st.caption(f"{hidden} earlier messages are no longer kept")
+    for message in shown:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+def show_collections(chatbot: CodingChatbot, key: str):
+    """Sidebar controls for the collections a session uploads into and searches"""
+    session = st.session_state.setdefault("session_namespace", new_session_namespace())
+    collections = [SHARED] + [name for name in list_namespaces() if not is_session_namespace(name)]
+    write = st.selectbox(
+        "Add uploads to", [session] + collections, key=f"{key}_write",
+        format_func=lambda name: "this session (temporary)" if name == session else name
+    )
+    search = st.multiselect(
+        "Search collections", collections, default=[SHARED], key=f"{key}_search",
+        help="The collection uploads go to is always searched too"
+    )
+    chatbot.use_collections(write, search)
+
+def show_trace(trace):
+    """Debug panel with the per-stage timings of the last request"""
+    if trace is None or trace.duration is None:
+        return
+    with st.expander(f"⏱️ {trace.name}: {trace.duration * 1000:.0f} ms"):
+        if trace.attributes:
+            st.caption(", ".join(f"{key}: {value}" for key, value in trace.attributes.items()))
+        st.dataframe(trace.breakdown(), use_container_width=True, hide_index=True)
 
 def main():
     st.set_page_config(
@@ -120,16 +623,20 @@ def main():
     st.title("🤖 AI Coding Tutor Chatbot")
     st.markdown("Upload your coding PDFs and ask programming questions!")
     
+    # Load shared models once per server process
+    warm_up(api_key=gemini_api_key(), persist_directory=PERSIST_DIRECTORY, snapshot_directory=configured_snapshot())
+    
     # Initialize chatbot
     if 'chatbot' not in st.session_state:
         st.session_state.chatbot = CodingChatbot()
     
     if 'messages' not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = ConversationHistory()
     
     # Sidebar for PDF upload
     with st.sidebar:
         st.header("📚 Training Materials")
+        show_collections(st.session_state.chatbot, "collections")
         
         uploaded_files = st.file_uploader(
             "Upload PDF files",
@@ -145,6 +652,8 @@ def main():
                 st.session_state.chatbot.setup_qa_chain()
                 st.success(f"Processed {len(uploaded_files)} PDF(s) successfully!")
         
+        st.checkbox("Show timing breakdown", key="show_trace")
+        
         st.markdown("---")
         st.markdown("### 💡 Example Questions")
         st.markdown("""
@@ -158,25 +667,25 @@ def main():
     st.header("💬 Chat Interface")
     
     # Display chat messages
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    show_history(st.session_state.messages, "messages")
     
     # Chat input
     if prompt := st.chat_input("Ask your coding question..."):
         # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        history = st.session_state.messages.context()
+        st.session_state.messages.append("user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
         
         # Generate response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.chatbot.answer_question(prompt)
-                st.markdown(response)
+            response = st.write_stream(st.session_state.chatbot.stream_answer(prompt, history))
         
         # Add assistant response
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        st.session_state.messages.append("assistant", response)
+    
+    if st.session_state.get("show_trace"):
+        show_trace(st.session_state.chatbot.last_trace)
     
     # Footer
     st.markdown("---")
@@ -0,0 +1,59 @@
+"""Compare two run_benchmarks result files.
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import argparse
+import json
+from typing import Dict, Iterator, Tuple
+
+# Metrics where a larger value is an improvement; everything else is a time
+HIGHER_IS_BETTER = ("per_sec",)
+
+
+def flatten(results: Dict, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            yield from flatten(value, name)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, float(value)
+
+
+def compare(baseline: Dict, candidate: Dict, threshold: float = 0.10):
+    """Rows of (metric, baseline, candidate, change, verdict) for metrics in both runs"""
+    before = dict(flatten(baseline["results"]))
+    after = dict(flatten(candidate["results"]))
+    rows = []
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        if not old:
+            continue
+        change = new / old - 1
+        improvement = change if name.endswith(HIGHER_IS_BETTER) else -change
+        verdict = "better" if improvement > threshold else "worse" if improvement < -threshold else ""
+        rows.append((name, old, new, change, verdict))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change reported as better/worse")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['meta'].get('commit')}  {baseline['meta'].get('timestamp')}")
+    print(f"candidate {candidate['meta'].get('commit')}  {candidate['meta'].get('timestamp')}")
+    rows = compare(baseline, candidate, args.threshold)
+    width = max((len(row[0]) for row in rows), default=0)
+    for name, old, new, change, verdict in rows:
+        print(f"{name:<{width}}  {old:>12.3f}  {new:>12.3f}  {change:>+8.1%}  {verdict}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Local stand-in for the Gemini REST API, for load-testing the LLM gateway.
+
+Serves generateContent and streamGenerateContent with synthetic answers,
+answers a share of requests with 429 RESOURCE_EXHAUSTED, and counts the
+requests and the peak concurrency it saw at /stats.
+
+    python -m benchmarks.fake_llm_server --port 8089 --throttle-rate 0.2
+    GEMINI_API_ENDPOINT=http://127.0.0.1:8089 streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fakes import VOCABULARY
+
+MODEL_PATH = re.compile(r"^/v1\w*/models/([^/:]+):(generateContent|streamGenerateContent)")
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.2, token_delay: float = 0.01,
+                 answer_words: int = 40, throttle_rate: float = 0.0, seed: int = 0):
+        super().__init__(address, FakeGeminiHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.answer_words = answer_words
+        self.throttle_rate = throttle_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "active": 0, "max_active": 0}
+
+    def answer(self, prompt: str):
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        return [rng.choice(VOCABULARY) + " " for _ in range(self.answer_words)]
+
+    def serve_in_thread(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, name="fake-gemini", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def candidate(text: str, finished: bool) -> dict:
+    result = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finished:
+        result["finishReason"] = "STOP"
+    return {"candidates": [result]}
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.startswith("/stats"):
+            with self.server.lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+
+    def do_POST(self):
+        match = MODEL_PATH.match(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if match is None:
+            self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+            return
+
+        server = self.server
+        with server.lock:
+            server.stats["requests"] += 1
+            server.stats["active"] += 1
+            server.stats["max_active"] = max(server.stats["max_active"], server.stats["active"])
+            throttled = server.rng.random() < server.throttle_rate
+            if throttled:
+                server.stats["throttled"] += 1
+        try:
+            if throttled:
+                self._send_json(429, {"error": {
+                    "code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                    "status": "RESOURCE_EXHAUSTED"
+                }})
+                return
+            time.sleep(server.latency)
+            prompt = "".join(
+                part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", [])
+            )
+            tokens = server.answer(prompt)
+            if match.group(2) == "generateContent":
+                self._send_json(200, candidate("".join(tokens), finished=True))
+            else:
+                self._stream(tokens, sse="alt=sse" in self.path)
+        finally:
+            with server.lock:
+                server.stats["active"] -= 1
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, tokens, sse: bool):
+        """Stream one candidate per token, as SSE events or as a JSON array"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if not sse:
+            self._write_chunk("[")
+        for i, token in enumerate(tokens):
+            time.sleep(self.server.token_delay)
+            payload = json.dumps(candidate(token, finished=i == len(tokens) - 1))
+            if sse:
+                self._write_chunk(f"data: {payload}\r\n\r\n")
+            else:
+                self._write_chunk(("," if i else "") + payload)
+        if not sse:
+            self._write_chunk("]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Gemini REST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of requests answered with 429")
+    args = parser.parse_args()
+
+    server = FakeGeminiServer((args.host, args.port), args.latency, args.token_delay,
+                              throttle_rate=args.throttle_rate)
+    print(f"fake Gemini API on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Offline stand-ins used by the benchmarks: synthetic PDFs and a fake Gemini."""
+import hashlib
+import io
+import random
+import time
+from typing import Any, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+VOCABULARY = (
+    "array list tuple dictionary set string integer float boolean function method class object "
+    "inheritance polymorphism encapsulation interface recursion iteration loop condition branch "
+    "pointer reference stack queue heap tree graph node edge hash table sort search binary linear "
+    "complexity algorithm compile runtime exception error debug test module package import variable"
+).split()
+
+
+def synthetic_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(VOCABULARY) for _ in range(words))
+
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Minimal PDF with one Helvetica text line per string"""
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {len(pages)} >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, lines in zip(page_ids, pages):
+        stream = "BT /F1 10 Tf 12 TL 40 760 Td " + " ".join(f"({escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+
+class NamedBytesIO(io.BytesIO):
+    """File-like object shaped like a Streamlit UploadedFile"""
+
+    def __init__(self, data: bytes, name: str):
+        super().__init__(data)
+        self.name = name
+
+
+def synthetic_pdfs(count: int, pages: int, seed: int = 0, lines_per_page: int = 50,
+                   words_per_line: int = 12) -> List[NamedBytesIO]:
+    rng = random.Random(seed)
+    files = []
+    for i in range(count):
+        content = [
+            [synthetic_text(rng, words_per_line) for _ in range(lines_per_page)]
+            for _ in range(pages)
+        ]
+        files.append(NamedBytesIO(make_pdf(content), f"synthetic-{seed}-{i}.pdf"))
+    return files
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for ChatGoogleGenerativeAI.
+
+    The answer is derived from a hash of the prompt, so identical prompts
+    give identical answers; latency and token delay simulate the network.
+    """
+
+    latency: float = 0.0
+    token_delay: float = 0.0
+    answer_words: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, messages: List[BaseMessage]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        return [rng.choice(VOCABULARY) + " " for _ in range(self.answer_words)]
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latency)
+        content = "".join(self._answer(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._answer(messages):
+            time.sleep(self.token_delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
@@ -0,0 +1,95 @@
+"""Load-test the LLM gateway against the fake Gemini server.
+
+Many threads ask a mix of repeated and unique prompts at once, while the
+server throttles a share of requests. Reports latency, errors and how
+many requests actually reached the server, with and without the gateway.
+
+    python -m benchmarks.llm_gateway_load --threads 32 --requests 4 --throttle-rate 0.2
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from typing import Any, Dict
+
+from benchmarks.fake_llm_server import FakeGeminiServer
+from benchmarks.run_benchmarks import percentiles
+
+
+def run(llm, args, stream: bool) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    prompts = [
+        f"explain topic {rng.randrange(args.distinct)}" if rng.random() < args.repeat_share else f"unique question {i}"
+        for i in range(args.threads * args.requests)
+    ]
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.threads)
+
+    def worker(offset: int):
+        barrier.wait()
+        for prompt in prompts[offset::args.threads]:
+            start = time.perf_counter()
+            try:
+                if stream:
+                    "".join(chunk.content for chunk in llm.stream(prompt))
+                else:
+                    llm.invoke(prompt)
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "calls": len(prompts),
+        "errors": len(errors),
+        "seconds": elapsed,
+        **(percentiles(latencies) if latencies else {}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the LLM gateway against a fake Gemini server")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=4, help="prompts per thread")
+    parser.add_argument("--repeat-share", type=float, default=0.5, help="share of prompts drawn from a small set")
+    parser.add_argument("--distinct", type=int, default=4, help="size of the repeated prompt set")
+    parser.add_argument("--throttle-rate", type=float, default=0.2)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=4, help="gateway concurrency cap")
+    parser.add_argument("--stream", action="store_true", help="stream instead of invoke")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from llm_gateway import LLMGateway
+
+    report = {}
+    for mode in ("direct", "gateway"):
+        server = FakeGeminiServer(("127.0.0.1", 0), latency=args.latency, throttle_rate=args.throttle_rate,
+                                  seed=args.seed)
+        server.serve_in_thread()
+        llm = ChatGoogleGenerativeAI(
+            model="gemini-1.5-flash", google_api_key="fake", max_retries=1,
+            client_options={"api_endpoint": server.url}, transport="rest"
+        )
+        if mode == "gateway":
+            llm = LLMGateway(llm, max_concurrency=args.concurrency, base_delay=0.05, max_delay=1.0)
+        report[mode] = run(llm, args, args.stream)
+        report[mode]["server"] = dict(server.stats)
+        server.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Offline benchmarks for the ingestion, retrieval, answer and code execution paths.
+
+Runs on a machine without network access: PDFs are generated, embeddings
+come from the hashing backend and Gemini is replaced by FakeChatModel.
+
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.compare baseline.json results.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+# Scratch directory holding every cache and store of a run, set by main()
+SCRATCH = None
+
+SUITES = ("ingest", "retrieval", "answer", "executor")
+
+EXECUTOR_PROGRAMS = {
+    "python": "print(sum(range(1000)))",
+    "javascript": "console.log([...Array(1000).keys()].reduce((a, b) => a + b, 0))",
+    "cpp": "#include <iostream>\nint main() { long s = 0; for (int i = 0; i < 1000; ++i) s += i; std::cout << s << std::endl; }",
+    "java": "public class Main { public static void main(String[] a) { long s = 0; for (int i = 0; i < 1000; ++i) s += i; System.out.println(s); } }",
+}
+EXECUTOR_TOOLS = {"python": sys.executable, "javascript": "node", "cpp": "g++", "java": "javac"}
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {
+        "p50_ms": at(0.50) * 1000,
+        "p95_ms": at(0.95) * 1000,
+        "p99_ms": at(0.99) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+    }
+
+
+def timed(fn: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def new_chatbot(name: str, llm=None, vector_backend: str = None):
+    from app import CodingChatbot
+    bot = CodingChatbot(persist_directory=os.path.join(SCRATCH, name), embedding_backend="hashing",
+                        vector_backend=vector_backend, snapshot_directory="")
+    bot.llm = llm
+    return bot
+
+
+def bench_ingest(args) -> Dict[str, Any]:
+    from benchmarks.fakes import synthetic_pdfs
+
+    files = synthetic_pdfs(args.pdfs, args.pages, seed=args.seed)
+    bot = new_chatbot("ingest")
+
+    start = time.perf_counter()
+    chunks = list(bot.process_pdfs(files))
+    process_seconds = time.perf_counter() - start
+    pages = args.pdfs * args.pages
+
+    create_seconds = timed(lambda: bot.create_vector_store(chunks))
+    # A second pass over the same files is skipped by the content-hash manifest
+    reprocess_seconds = timed(lambda: bot.create_vector_store(bot.process_pdfs(files)))
+
+    return {
+        "pages": pages,
+        "chunks": len(chunks),
+        "process_pdfs_seconds": process_seconds,
+        "process_pdfs_pages_per_sec": pages / process_seconds,
+        "create_vector_store_seconds": create_seconds,
+        "create_vector_store_chunks_per_sec": len(chunks) / create_seconds,
+        "reprocess_unchanged_seconds": reprocess_seconds,
+    }
+
+
+def bench_retrieval(args) -> Dict[str, Any]:
+    import random
+    from benchmarks.fakes import synthetic_text
+
+    from resources import reload_vector_stores
+
+    rng = random.Random(args.seed)
+    queries = [synthetic_text(rng, 8) for _ in range(args.queries)]
+    corpora = {size: [synthetic_text(rng, 150) for _ in range(size)] for size in args.corpus_sizes}
+    results = {}
+    for vector_backend in args.vector_backends:
+        results[vector_backend] = {}
+        for size, texts in corpora.items():
+            bot = new_chatbot(f"retrieval-{vector_backend}-{size}", vector_backend=vector_backend)
+            build_seconds = timed(lambda: bot.create_vector_store(texts))
+            # Time opening the persisted store as a fresh process would
+            reload_vector_stores(bot.persist_directory)
+            bot.vector_store = None
+            open_seconds = timed(bot.load_vector_store)
+            store = bot.vector_store
+            store.similarity_search(queries[0], k=3)
+            samples = [timed(lambda q=q: store.similarity_search(q, k=3)) for q in queries]
+            results[vector_backend][str(size)] = {
+                "build_seconds": build_seconds, "open_seconds": open_seconds, **percentiles(samples)
+            }
+    return results
+
+
+def bench_answer(args) -> Dict[str, Any]:
+    import random
+    from benchmarks.fakes import FakeChatModel, synthetic_pdfs, synthetic_text
+
+    bot = new_chatbot("answer", llm=FakeChatModel())
+    bot.create_vector_store(bot.process_pdfs(synthetic_pdfs(2, 5, seed=args.seed)))
+    bot.setup_qa_chain()
+    bot.answer_cache.clear()
+
+    rng = random.Random(args.seed)
+    # Random word salads are far enough apart to miss the semantic tier
+    questions = [synthetic_text(rng, 12) for _ in range(args.queries)]
+    cold, input_tokens = [], []
+    for q in questions:
+        cold.append(timed(lambda: bot.answer_question(q)))
+        input_tokens.append(bot.last_input_tokens)
+    cached = [timed(lambda q=q: bot.answer_question(q)) for q in questions]
+
+    first_token = []
+    bot.answer_cache.clear()
+    for q in questions:
+        for _ in bot.stream_answer(q):
+            pass
+        first_token.append(bot.last_time_to_first_token)
+    return {
+        "uncached": percentiles(cold),
+        "mean_input_tokens": statistics.fmean(input_tokens),
+        "cached": percentiles(cached),
+        "stream_time_to_first_token": percentiles(first_token),
+    }
+
+
+def bench_executor(args) -> Dict[str, Any]:
+    from code_executor import BuildCache, PythonWorkerPool, SafeCodeExecutor
+
+    configurations = {"plain": lambda: SafeCodeExecutor()}
+    if hasattr(os, "fork"):
+        configurations["python_pool"] = lambda: SafeCodeExecutor(python_pool=PythonWorkerPool(size=2))
+    configurations["build_cache"] = lambda: SafeCodeExecutor(build_cache=BuildCache())
+
+    results = {}
+    for name, make_executor in configurations.items():
+        executor = make_executor()
+        results[name] = {}
+        for language, program in EXECUTOR_PROGRAMS.items():
+            if shutil.which(EXECUTOR_TOOLS[language]) is None:
+                continue
+            if name == "python_pool" and language != "python":
+                continue
+            if name == "build_cache" and language not in ("cpp", "java"):
+                continue
+            failures = 0
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                failures += not executor.execute_code(program, language)["success"]
+            elapsed = time.perf_counter() - start
+            results[name][language] = {"runs_per_sec": args.runs / elapsed, "failures": failures}
+        if executor.python_pool is not None:
+            executor.python_pool.close()
+    return results
+
+
+def metadata() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline benchmark suite")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated subset of {', '.join(SUITES)}")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pdfs", type=int, default=4)
+    parser.add_argument("--pages", type=int, default=25)
+    parser.add_argument("--corpus-sizes", type=lambda v: [int(x) for x in v.split(",")], default=[1000, 5000])
+    parser.add_argument("--vector-backends", type=lambda v: v.split(","), default=["chroma", "mmap"])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20, help="executions per language")
+    args = parser.parse_args()
+
+    benches = {
+        "ingest": bench_ingest,
+        "retrieval": bench_retrieval,
+        "answer": bench_answer,
+        "executor": bench_executor,
+    }
+    # The app modules read these when first imported, inside the suites
+    global SCRATCH
+    SCRATCH = tempfile.mkdtemp(prefix="codex-bench-")
+    os.environ["EMBEDDING_CACHE_DIR"] = os.path.join(SCRATCH, "embedding_cache")
+    os.environ["BUILD_CACHE_DIR"] = os.path.join(SCRATCH, "build_cache")
+    os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+    os.environ.setdefault("WARM_UP", "0")
+
+    report = {"meta": metadata(), "results": {}}
+    try:
+        for suite in args.suites.split(","):
+            print(f"running {suite}...", file=sys.stderr)
+            report["results"][suite] = benches[suite](args)
+    finally:
+        shutil.rmtree(SCRATCH, ignore_errors=True)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,534 @@ import subprocess
 import tempfile
 import os
 import sys
-from typing import Dict, Any
+import codecs
+import contextvars
+import functools
+import hashlib
+import json
+import queue
+import re
+import select
+import shutil
+import signal
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, Any, Optional, Tuple
 
-class SafeCodeExecutor:
+from metrics import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BUILD_CACHE_DIR = os.getenv("BUILD_CACHE_DIR", os.path.join(tempfile.gettempdir(), "codex_build_cache"))
+BUILD_CACHE_BYTES = int(os.getenv("BUILD_CACHE_BYTES", str(256 * 1024 * 1024)))
+CPP_FLAGS = []
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(os.cpu_count() or 2)))
+EXECUTOR_QUEUE_LIMIT = int(os.getenv("EXECUTOR_QUEUE_LIMIT", "32"))
+EXECUTOR_SESSION_QUEUE_LIMIT = int(os.getenv("EXECUTOR_SESSION_QUEUE_LIMIT", "8"))
+JAVAC_FLAGS = []
+EXECUTION_TIMEOUT = 10
+MAX_OUTPUT_BYTES = int(os.getenv("EXECUTOR_MAX_OUTPUT_BYTES", str(64 * 1024)))
+
+# Runs inside each pooled interpreter. Requests and responses are JSON lines
+# on private copies of stdin/stdout; every snippet runs in a forked child so
+# runs cannot see each other's state and a crash only kills the child.
+PYTHON_WORKER_SOURCE = r"""
+import codecs, json, os, resource, select, signal, sys, time, traceback
+
+proto_in = os.fdopen(os.dup(0), "rb")
+proto_out = os.fdopen(os.dup(1), "wb")
+devnull = os.open(os.devnull, os.O_RDWR)
+os.dup2(devnull, 0)
+os.dup2(devnull, 1)
+
+def run_child(code):
+    proto_in.close()
+    proto_out.close()
+    sys.argv = ["<snippet>"]
+    try:
+        exec(compile(code, "<snippet>", "exec"), {"__name__": "__main__", "__builtins__": __builtins__})
+        status = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            status = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        # Hide this wrapper's frame so tracebacks start at the snippet
+        error_type, error, tb = sys.exc_info()
+        traceback.print_exception(error_type, error, tb.tb_next)
+        status = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(status)
+
+def apply_limits(limits):
+    for name, value in limits.items():
+        limit = getattr(resource, name)
+        hard = resource.getrlimit(limit)[1]
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(limit, (value, value))
+
+def run(request):
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.setpgid(0, 0)
+        os.close(out_r)
+        os.close(err_r)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        apply_limits(request["limits"])
+        run_child(request["code"])
+    os.close(out_w)
+    os.close(err_w)
+
+    names = {out_r: "stdout", err_r: "stderr"}
+    decoders = {fd: codecs.getincrementaldecoder("utf-8")("replace") for fd in names}
+    text = {fd: [] for fd in names}
+    sizes = {fd: 0 for fd in names}
+    open_fds = [out_r, err_r]
+    deadline = time.monotonic() + request["timeout"]
+    timed_out = False
+    truncated = None
+    while open_fds and not truncated:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        ready, _, _ = select.select(open_fds, [], [], remaining)
+        for fd in ready:
+            data = os.read(fd, 65536)
+            if not data:
+                open_fds.remove(fd)
+                continue
+            room = request["max_output_bytes"] - sizes[fd]
+            if len(data) > room:
+                data = data[:room]
+                truncated = names[fd]
+            sizes[fd] += len(data)
+            chunk = decoders[fd].decode(data)
+            text[fd].append(chunk)
+            if request["stream"] and chunk:
+                send({"event": "output", "stream": names[fd], "data": chunk})
+    if timed_out or truncated:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    _, status = os.waitpid(pid, 0)
+    os.close(out_r)
+    os.close(err_r)
+    for fd in names:
+        text[fd].append(decoders[fd].decode(b"", final=True))
+    return {
+        "event": "result",
+        "returncode": os.waitstatus_to_exitcode(status),
+        "stdout": "".join(text[out_r]),
+        "stderr": "".join(text[err_r]),
+        "timed_out": timed_out,
+        "truncated": truncated,
+    }
+
+def send(message):
+    proto_out.write(json.dumps(message).encode("utf-8") + b"\n")
+    proto_out.flush()
+
+for line in proto_in:
+    send(run(json.loads(line)))
+"""
+
+
+OutputCallback = Callable[[str, str], None]
+
+
+def run_bounded(command, timeout: float = EXECUTION_TIMEOUT, max_output_bytes: int = MAX_OUTPUT_BYTES,
+                on_output: Optional[OutputCallback] = None, **popen_kwargs) -> Dict[str, Any]:
+    """Run a command, reading stdout and stderr incrementally.
+    
+    Each stream keeps at most max_output_bytes; the process group is killed
+    as soon as either stream passes that cap or the timeout expires.
+    on_output(stream, text) receives output while the program is running.
+    """
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+        **popen_kwargs
+    )
+    names = {process.stdout.fileno(): "stdout", process.stderr.fileno(): "stderr"}
+    decoders = {name: codecs.getincrementaldecoder("utf-8")("replace") for name in names.values()}
+    text = {name: [] for name in names.values()}
+    sizes = {name: 0 for name in names.values()}
+    open_fds = list(names)
+    deadline = time.monotonic() + timeout
+    timed_out = False
+    truncated = None
+    
+    try:
+        while open_fds and not truncated:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            ready, _, _ = select.select(open_fds, [], [], remaining)
+            for fd in ready:
+                data = os.read(fd, 65536)
+                if not data:
+                    open_fds.remove(fd)
+                    continue
+                name = names[fd]
+                room = max_output_bytes - sizes[name]
+                if len(data) > room:
+                    data = data[:room]
+                    truncated = name
+                sizes[name] += len(data)
+                chunk = decoders[name].decode(data)
+                text[name].append(chunk)
+                if on_output and chunk:
+                    on_output(name, chunk)
+        if not (timed_out or truncated or open_fds):
+            # Both pipes closed, but the program may still be running
+            try:
+                process.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+    finally:
+        if timed_out or truncated or open_fds:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        process.wait()
+        process.stdout.close()
+        process.stderr.close()
+    
+    for name in text:
+        text[name].append(decoders[name].decode(b"", final=True))
+    return {
+        "returncode": process.returncode,
+        "stdout": "".join(text["stdout"]),
+        "stderr": "".join(text["stderr"]),
+        "timed_out": timed_out,
+        "truncated": truncated,
+    }
+
+
+def result_from_run(run: Dict[str, Any], timeout: float, max_output_bytes: int,
+                    on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+    """Turn a run_bounded-style run into the execute_code result dict"""
+    if run["truncated"]:
+        marker = f"\n... [output truncated after {max_output_bytes} bytes]\n"
+        run[run["truncated"]] += marker
+        if on_output:
+            on_output(run["truncated"], marker)
+    
+    if run["timed_out"]:
+        return {
+            "success": False,
+            "output": run["stdout"],
+            "error": f"Execution timed out after {timeout} seconds",
+            "truncated": bool(run["truncated"])
+        }
+    error = run["stderr"]
+    if run["returncode"] is not None and run["returncode"] < 0 and not run["truncated"]:
+        # Killed by a signal, e.g. an rlimit, often without writing to stderr
+        if error and not error.endswith("\n"):
+            error += "\n"
+        error += killed_message(-run["returncode"])
+    return {
+        "success": run["returncode"] == 0,
+        "output": run["stdout"],
+        "error": error,
+        "truncated": bool(run["truncated"])
+    }
+
+
+def killed_message(signum: int) -> str:
+    """Why a program was killed by signal signum, as shown to the user"""
+    try:
+        name = signal.Signals(signum).name
+    except ValueError:
+        name = f"signal {signum}"
+    if name in ("SIGKILL", "SIGXCPU", "SIGXFSZ"):
+        return f"Killed by {name} (CPU, memory or file size limit reached)"
+    return f"Killed by {name}"
+
+
+class _PythonWorker:
+    """One pre-started interpreter running PYTHON_WORKER_SOURCE"""
+    
     def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", PYTHON_WORKER_SOURCE],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        self.runs = 0
+        self._buffer = b""
+    
+    def run(self, code: str, timeout: float, limits: Dict[str, int], max_output_bytes: int,
+            on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Send one snippet and wait for its result; raises TimeoutError if the worker hangs"""
+        self.runs += 1
+        request = {
+            "code": code,
+            "timeout": timeout,
+            "limits": limits,
+            "max_output_bytes": max_output_bytes,
+            "stream": on_output is not None,
+        }
+        self.process.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+        self.process.stdin.flush()
+        
+        # Allow the worker time to kill a runaway child and report back
+        deadline = time.monotonic() + timeout + 5
+        while True:
+            message = self._read_message(deadline)
+            if message["event"] == "result":
+                return message
+            on_output(message["stream"], message["data"])
+    
+    def _read_message(self, deadline: float) -> Dict[str, Any]:
+        fd = self.process.stdout.fileno()
+        while b"\n" not in self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Python worker did not respond")
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if ready:
+                data = os.read(fd, 65536)
+                if not data:
+                    raise RuntimeError("Python worker exited unexpectedly")
+                self._buffer += data
+        line, self._buffer = self._buffer.split(b"\n", 1)
+        return json.loads(line)
+    
+    def close(self):
+        try:
+            os.killpg(self.process.pid, 9)
+        except OSError:
+            pass
+        self.process.wait()
+
+
+class PythonWorkerPool:
+    """Pool of warm Python interpreters for SafeCodeExecutor.execute_python.
+    
+    Workers are started ahead of time and replaced after max_runs snippets,
+    or as soon as one crashes or a snippet times out.
+    """
+    
+    def __init__(self, size: int = 2, max_runs: int = 50, timeout: float = EXECUTION_TIMEOUT):
+        self.size = size
+        self.max_runs = max_runs
+        self.timeout = timeout
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(_PythonWorker())
+    
+    def execute(self, code: str, limits: Optional["ResourceLimits"] = None,
+                max_output_bytes: int = MAX_OUTPUT_BYTES, on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Run a snippet on an idle worker and return the execute_code result dict"""
+        worker = self._idle.get()
+        healthy = False
+        try:
+            run = worker.run(code, self.timeout, limits.as_dict() if limits else {}, max_output_bytes, on_output)
+            healthy = not run["timed_out"]
+        except (OSError, RuntimeError, TimeoutError, ValueError) as e:
+            return {
+                "success": False,
+                "output": "",
+                "error": str(e)
+            }
+        finally:
+            if healthy and worker.runs < self.max_runs:
+                self._idle.put(worker)
+            else:
+                worker.close()
+                self._idle.put(_PythonWorker())
+        
+        return result_from_run(run, self.timeout, max_output_bytes, on_output)
+    
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get().close()
+
+
+@functools.lru_cache(maxsize=None)
+def compiler_version(compiler: str) -> str:
+    """First line of the compiler's version banner, part of every build cache key"""
+    flag = '-version' if compiler == 'javac' else '--version'
+    try:
+        result = subprocess.run([compiler, flag], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return "unknown"
+    banner = (result.stdout or result.stderr).strip()
+    return banner.splitlines()[0] if banner else "unknown"
+
+
+class BuildCache:
+    """Content-addressed cache of compiled C++ executables and Java class files.
+    
+    Builds are keyed on the source, compiler version and flags. Each entry
+    is a directory whose mtime is refreshed on every hit; once the cache
+    grows past max_bytes the least recently used entries are removed.
+    """
+    
+    def __init__(self, directory: str = BUILD_CACHE_DIR, max_bytes: int = BUILD_CACHE_BYTES):
+        self.directory = os.path.abspath(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.compile_seconds_saved = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+    
+    def key(self, language: str, code: str, toolchain: str, flags) -> str:
+        digest = hashlib.sha256()
+        for part in (language, toolchain, " ".join(flags), code):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+    
+    def lookup(self, key: str) -> Optional[str]:
+        """Directory of a cached build, or None"""
+        entry = os.path.join(self.directory, key)
+        try:
+            with open(os.path.join(entry, "build.json")) as f:
+                compile_seconds = json.load(f)["compile_seconds"]
+            os.utime(entry)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            metrics.increment("build_cache.misses")
+            return None
+        
+        with self._lock:
+            self.hits += 1
+            self.compile_seconds_saved += compile_seconds
+        metrics.increment("build_cache.hits")
+        metrics.increment("build_cache.compile_seconds_saved", compile_seconds)
+        return entry
+    
+    def store(self, key: str, build_dir: str, compile_seconds: float) -> str:
+        """Move a fresh build into the cache and return its cached directory"""
+        with open(os.path.join(build_dir, "build.json"), 'w') as f:
+            json.dump({"compile_seconds": compile_seconds}, f)
+        entry = os.path.join(self.directory, key)
+        staging = tempfile.mkdtemp(dir=self.directory, prefix=".staging-")
+        shutil.rmtree(staging)
+        shutil.move(build_dir, staging)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Another run stored the same build first
+            shutil.rmtree(staging, ignore_errors=True)
+        self._evict()
+        return entry
+    
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                if name.startswith(".") or not os.path.isdir(path):
+                    continue
+                size = sum(
+                    os.path.getsize(os.path.join(root, file))
+                    for root, _, files in os.walk(path) for file in files
+                )
+                entries.append((os.path.getmtime(path), size, path))
+                total += size
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+                metrics.increment("build_cache.evictions")
+    
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "compile_seconds_saved": self.compile_seconds_saved,
+        }
+
+
+class ResourceLimits:
+    """rlimits applied to every process a code execution job starts.
+    
+    RLIMIT_NPROC counts all processes and threads of the user, including the
+    server's own, so max_processes must leave room for them; it is not
+    enforced for root, which is why the Docker image runs as appuser.
+    """
+    
+    def __init__(self, cpu_seconds: int = 10, memory_bytes: int = 512 * 1024 * 1024,
+                 max_processes: int = 512, file_bytes: int = 64 * 1024 * 1024):
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self.max_processes = max_processes
+        self.file_bytes = file_bytes
+    
+    @property
+    def memory_mb(self) -> int:
+        return self.memory_bytes // (1024 * 1024)
+    
+    def as_dict(self, limit_memory: bool = True) -> Dict[str, int]:
+        """resource module limit names mapped to values"""
+        limits = {
+            "RLIMIT_CPU": self.cpu_seconds,
+            "RLIMIT_NPROC": self.max_processes,
+            "RLIMIT_FSIZE": self.file_bytes,
+        }
+        if limit_memory:
+            limits["RLIMIT_AS"] = self.memory_bytes
+        return limits
+    
+    def preexec(self, limit_memory: bool = True):
+        """preexec_fn for subprocess that applies the limits in the child.
+        
+        Everything is looked up here, in the parent: between fork and exec
+        the child may only make plain system calls, not import modules.
+        """
+        if resource is None:
+            return None
+        limits = [(getattr(resource, name), value) for name, value in self.as_dict(limit_memory).items()]
+        infinity = resource.RLIM_INFINITY
+        getrlimit = resource.getrlimit
+        setrlimit = resource.setrlimit
+        
+        def apply():
+            for limit, value in limits:
+                hard = getrlimit(limit)[1]
+                if hard != infinity:
+                    value = min(value, hard)
+                setrlimit(limit, (value, value))
+        return apply
+
+
+class SafeCodeExecutor:
+    def __init__(self, python_pool: Optional[PythonWorkerPool] = None, build_cache: Optional[BuildCache] = None,
+                 limits: Optional[ResourceLimits] = None, max_output_bytes: int = MAX_OUTPUT_BYTES):
+        self.python_pool = python_pool
+        self.build_cache = build_cache
+        self.limits = limits
+        self.max_output_bytes = max_output_bytes
         self.supported_languages = {
             'python': self.execute_python,
             'java': self.execute_java,
@@ -13,8 +537,11 @@ class SafeCodeExecutor:
             'javascript': self.execute_javascript
         }
     
-    def execute_code(self, code: str, language: str) -> Dict[str, Any]:
-        """Execute code safely and return results"""
+    def execute_code(self, code: str, language: str, on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
+        """Execute code safely and return results.
+        
+        on_output(stream, text) is called with output while the program runs.
+        """
         if language.lower() not in self.supported_languages:
             return {
                 "success": False,
@@ -23,7 +550,8 @@ class SafeCodeExecutor:
             }
         
         try:
-            return self.supported_languages[language.lower()](code)
+            with metrics.span(f"executor.run.{language.lower()}"):
+                return self.supported_languages[language.lower()](code, on_output)
         except Exception as e:
             return {
                 "success": False,
@@ -31,138 +559,246 @@ class SafeCodeExecutor:
                 "error": str(e)
             }
     
-    def execute_python(self, code: str) -> Dict[str, Any]:
+    def execute_python(self, code: str, on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
         """Execute Python code"""
+        if self.python_pool is not None:
+            return self.python_pool.execute(code, self.limits, self.max_output_bytes, on_output)
+        
         with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
             f.write(code)
             temp_file = f.name
         
         try:
-            result = subprocess.run(
-                [sys.executable, temp_file],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            return {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr
-            }
+            return self._run([sys.executable, temp_file], on_output)
         finally:
             os.unlink(temp_file)
     
-    def execute_java(self, code: str) -> Dict[str, Any]:
+    def _run(self, command, on_output: Optional[OutputCallback] = None, limit_memory: bool = True, **popen_kwargs) -> Dict[str, Any]:
+        """Run a command with bounded output capture and return the result dict"""
+        run = run_bounded(
+            command,
+            timeout=EXECUTION_TIMEOUT,
+            max_output_bytes=self.max_output_bytes,
+            on_output=on_output,
+            preexec_fn=self._preexec(limit_memory),
+            **popen_kwargs
+        )
+        return result_from_run(run, EXECUTION_TIMEOUT, self.max_output_bytes, on_output)
+    
+    def _preexec(self, limit_memory: bool = True):
+        """preexec_fn enforcing self.limits, or None when unlimited"""
+        if self.limits is None:
+            return None
+        return self.limits.preexec(limit_memory)
+    
+    def _heap_args(self, flag_format: str):
+        """Heap size flag for runtimes that reserve more address space than they use"""
+        if self.limits is None:
+            return []
+        return [flag_format.format(mb=self.limits.memory_mb)]
+    
+    def _build(self, language: str, code: str, source_name: str, compile_command, flags) -> Tuple[Optional[str], Optional[str]]:
+        """Compile code, or reuse a cached build of the same source, toolchain and flags.
+        
+        Returns the directory holding the build output, or the compiler's
+        error output if compilation failed.
+        """
+        key = None
+        if self.build_cache is not None:
+            key = self.build_cache.key(language, code, compiler_version(compile_command[0]), flags)
+            cached = self.build_cache.lookup(key)
+            if cached is not None:
+                return cached, None
+        
+        work_dir = tempfile.mkdtemp()
+        try:
+            src_dir = os.path.join(work_dir, "src")
+            out_dir = os.path.join(work_dir, "build")
+            os.makedirs(src_dir)
+            os.makedirs(out_dir)
+            with open(os.path.join(src_dir, source_name), 'w') as f:
+                f.write(code)
+            
+            start = time.perf_counter()
+            compile_result = self._run(
+                [*compile_command, *flags, source_name, *self._output_args(language, out_dir)],
+                limit_memory=False,
+                cwd=src_dir
+            )
+            compile_seconds = time.perf_counter() - start
+        except BaseException:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            raise
+        
+        if not compile_result["success"]:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return None, compile_result["error"]
+        if key is not None:
+            build_dir = self.build_cache.store(key, out_dir, compile_seconds)
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return build_dir, None
+        return out_dir, None
+    
+    @staticmethod
+    def _output_args(language: str, out_dir: str):
+        if language == "java":
+            return ['-d', out_dir]
+        return ['-o', os.path.join(out_dir, 'program')]
+    
+    def _release_build(self, build_dir: str):
+        """Delete an uncached build once it has run"""
+        if self.build_cache is None or not build_dir.startswith(self.build_cache.directory):
+            shutil.rmtree(os.path.dirname(build_dir), ignore_errors=True)
+    
+    def execute_java(self, code: str, on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
         """Execute Java code"""
         # Extract class name from code
         class_name = "Main"
         if "public class" in code:
-            import re
             match = re.search(r'public class (\w+)', code)
             if match:
                 class_name = match.group(1)
         
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.java', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
+        build_dir, error = self._build('java', code, f"{class_name}.java", ['javac'], JAVAC_FLAGS)
+        if build_dir is None:
+            return {
+                "success": False,
+                "output": "",
+                "error": error
+            }
         
         try:
-            # Compile
-            compile_result = subprocess.run(
-                ['javac', temp_file],
-                capture_output=True,
-                text=True,
-                timeout=10
+            return self._run(
+                ['java', *self._heap_args('-Xmx{mb}m'), '-cp', build_dir, class_name],
+                on_output,
+                limit_memory=False
             )
-            
-            if compile_result.returncode != 0:
-                return {
-                    "success": False,
-                    "output": "",
-                    "error": compile_result.stderr
-                }
-            
-            # Execute
-            class_file = temp_file.replace('.java', '.class')
-            result = subprocess.run(
-                ['java', '-cp', os.path.dirname(temp_file), class_name],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            return {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr
-            }
         finally:
-            os.unlink(temp_file)
-            class_file = temp_file.replace('.java', '.class')
-            if os.path.exists(class_file):
-                os.unlink(class_file)
+            self._release_build(build_dir)
     
-    def execute_cpp(self, code: str) -> Dict[str, Any]:
+    def execute_cpp(self, code: str, on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
         """Execute C++ code"""
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.cpp', delete=False) as f:
-            f.write(code)
-            temp_file = f.name
-        
-        executable = temp_file.replace('.cpp', '')
-        
-        try:
-            # Compile
-            compile_result = subprocess.run(
-                ['g++', temp_file, '-o', executable],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if compile_result.returncode != 0:
-                return {
-                    "success": False,
-                    "output": "",
-                    "error": compile_result.stderr
-                }
-            
-            # Execute
-            result = subprocess.run(
-                [executable],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
+        build_dir, error = self._build('cpp', code, "main.cpp", ['g++'], CPP_FLAGS)
+        if build_dir is None:
             return {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr
+                "success": False,
+                "output": "",
+                "error": error
             }
+        
+        try:
+            return self._run([os.path.join(build_dir, 'program')], on_output)
         finally:
-            os.unlink(temp_file)
-            if os.path.exists(executable):
-                os.unlink(executable)
+            self._release_build(build_dir)
     
-    def execute_javascript(self, code: str) -> Dict[str, Any]:
+    def execute_javascript(self, code: str, on_output: Optional[OutputCallback] = None) -> Dict[str, Any]:
         """Execute JavaScript code using Node.js"""
         with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False) as f:
             f.write(code)
             temp_file = f.name
         
         try:
-            result = subprocess.run(
-                ['node', temp_file],
-                capture_output=True,
-                text=True,
-                timeout=10
+            return self._run(
+                ['node', *self._heap_args('--max-old-space-size={mb}'), temp_file],
+                on_output,
+                limit_memory=False
             )
+        finally:
+            os.unlink(temp_file)
+
+
+class ExecutionScheduler:
+    """Process-wide admission control in front of a SafeCodeExecutor.
+    
+    A fixed number of worker threads run jobs. Queued jobs are kept per
+    session and served round-robin, so one busy session cannot starve the
+    others. Jobs beyond the global or per-session queue limits are rejected
+    immediately instead of waiting.
+    """
+    
+    def __init__(self, executor: SafeCodeExecutor, workers: int = EXECUTOR_WORKERS,
+                 max_queued: int = EXECUTOR_QUEUE_LIMIT, max_queued_per_session: int = EXECUTOR_SESSION_QUEUE_LIMIT):
+        self.executor = executor
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_queued_per_session = max_queued_per_session
+        self._sessions: "OrderedDict[str, deque]" = OrderedDict()
+        self._queued = 0
+        self._running = 0
+        self._cond = threading.Condition()
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"code-exec-{i}", daemon=True).start()
+    
+    def submit(self, code: str, language: str, session_id: str = "default",
+               on_output: Optional[OutputCallback] = None) -> Future:
+        """Queue a job; the future resolves to the execute_code result dict"""
+        future = Future()
+        with self._cond:
+            session_queue = self._sessions.get(session_id, ())
+            if self._queued >= self.max_queued or len(session_queue) >= self.max_queued_per_session:
+                metrics.increment("executor.rejected")
+                future.set_result({
+                    "success": False,
+                    "output": "",
+                    "error": "Too many code executions are queued right now, please try again shortly",
+                    "status": "rejected"
+                })
+                return future
             
+            # Run the job in the submitter's context so its spans join the request's trace
+            job = (code, language, on_output, future, time.monotonic(), contextvars.copy_context())
+            self._sessions.setdefault(session_id, deque()).append(job)
+            self._queued += 1
+            metrics.set_gauge("executor.queue_depth", self._queued)
+            self._cond.notify()
+        return future
+    
+    def execute_code(self, code: str, language: str, session_id: str = "default") -> Dict[str, Any]:
+        """Blocking form of submit()"""
+        return self.submit(code, language, session_id).result()
+    
+    def _next_job(self):
+        """Pop the next job round-robin across sessions; callers hold the lock"""
+        session_id, session_queue = next(iter(self._sessions.items()))
+        job = session_queue.popleft()
+        del self._sessions[session_id]
+        if session_queue:
+            self._sessions[session_id] = session_queue
+        self._queued -= 1
+        return job
+    
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._sessions:
+                    self._cond.wait()
+                code, language, on_output, future, enqueued, context = self._next_job()
+                metrics.set_gauge("executor.queue_depth", self._queued)
+            
+            # Jobs abandoned by their request's deadline are skipped
+            if not future.set_running_or_notify_cancel():
+                continue
+            context.run(metrics.record_span, "executor.queue_wait", time.monotonic() - enqueued)
+            
+            with self._cond:
+                self._running += 1
+                metrics.set_gauge("executor.running", self._running)
+            try:
+                result = context.run(self.executor.execute_code, code, language, on_output)
+                result["status"] = "completed"
+                future.set_result(result)
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running -= 1
+                    metrics.set_gauge("executor.running", self._running)
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
             return {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._queued,
+                "queued_by_session": {session_id: len(q) for session_id, q in self._sessions.items()},
             }
-        finally:
-            os.unlink(temp_file)
@@ -1,6 +1,8 @@
 import streamlit as st
-from app import CodingChatbot
-from enchance_app import EnhancedCodingChatbot
+from app import PERSIST_DIRECTORY, CodingChatbot, gemini_api_key, show_collections, show_history, show_trace
+from snapshot import configured_snapshot
+from conversation import ConversationHistory
+from resources import warm_up
 
 def run_basic_chatbot():
     st.title("🤖 AI Coding Tutor Chatbot")
@@ -10,10 +12,11 @@ def run_basic_chatbot():
         st.session_state.chatbot_basic = CodingChatbot()
     
     if 'messages_basic' not in st.session_state:
-        st.session_state.messages_basic = []
+        st.session_state.messages_basic = ConversationHistory()
     
     with st.sidebar:
         st.header("📚 Training Materials")
+        show_collections(st.session_state.chatbot_basic, "collections_basic")
         uploaded_files = st.file_uploader(
             "Upload PDF files",
             type="pdf",
@@ -37,31 +40,30 @@ def run_basic_chatbot():
         """)
     
     st.header("💬 Chat Interface")
-    for message in st.session_state.messages_basic:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    show_history(st.session_state.messages_basic, "messages_basic")
     
     if prompt := st.chat_input("Ask your coding question..."):
-        st.session_state.messages_basic.append({"role": "user", "content": prompt})
+        history = st.session_state.messages_basic.context()
+        st.session_state.messages_basic.append("user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
         
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.chatbot_basic.answer_question(prompt)
-                st.markdown(response)
+            response = st.write_stream(st.session_state.chatbot_basic.stream_answer(prompt, history))
         
-        st.session_state.messages_basic.append({"role": "assistant", "content": response})
+        st.session_state.messages_basic.append("assistant", response)
 
 def run_enhanced_chatbot():
     st.title("🚀 Enhanced AI Coding Tutor")
     st.markdown("Upload PDFs, ask questions, and execute code - all for free!")
     
     if 'chatbot_enhanced' not in st.session_state:
+        # The code execution stack is imported only when this mode is first used
+        from enchance_app import EnhancedCodingChatbot
         st.session_state.chatbot_enhanced = EnhancedCodingChatbot()
     
     if 'messages_enhanced' not in st.session_state:
-        st.session_state.messages_enhanced = []
+        st.session_state.messages_enhanced = ConversationHistory()
     
     with st.sidebar:
         st.header("🛠️ Features")
@@ -74,6 +76,7 @@ def run_enhanced_chatbot():
         """)
         
         st.header("📚 Upload Training PDFs")
+        show_collections(st.session_state.chatbot_enhanced, "collections_enhanced")
         uploaded_files = st.file_uploader(
             "Choose PDF files",
             type="pdf",
@@ -87,21 +90,18 @@ def run_enhanced_chatbot():
                 st.session_state.chatbot_enhanced.setup_qa_chain()
                 st.success("✅ PDFs processed!")
     
-    for message in st.session_state.messages_enhanced:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    show_history(st.session_state.messages_enhanced, "messages_enhanced")
     
     if prompt := st.chat_input("Ask anything about coding..."):
-        st.session_state.messages_enhanced.append({"role": "user", "content": prompt})
+        history = st.session_state.messages_enhanced.context()
+        st.session_state.messages_enhanced.append("user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
         
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Thinking..."):
-                response = st.session_state.chatbot_enhanced.answer_with_code_execution(prompt)
-                st.markdown(response)
+            response = st.write_stream(st.session_state.chatbot_enhanced.stream_with_code_execution(prompt, history))
         
-        st.session_state.messages_enhanced.append({"role": "assistant", "content": response})
+        st.session_state.messages_enhanced.append("assistant", response)
 
 def main():
     st.set_page_config(
@@ -110,12 +110,21 @@ def main():
         layout="wide"
     )
     
+    # Both modes share one set of models per server process
+    warm_up(api_key=gemini_api_key(), persist_directory=PERSIST_DIRECTORY, snapshot_directory=configured_snapshot())
+    
     tab = st.sidebar.radio("Select Mode", ["Basic Coding Tutor", "Enhanced Coding Tutor"])
+    st.sidebar.checkbox("Show timing breakdown", key="show_trace")
     
     if tab == "Basic Coding Tutor":
         run_basic_chatbot()
+        chatbot = st.session_state.chatbot_basic
     else:
         run_enhanced_chatbot()
+        chatbot = st.session_state.chatbot_enhanced
+    
+    if st.session_state.get("show_trace"):
+        show_trace(chatbot.last_trace)
 
 if __name__ == "__main__":
     main()
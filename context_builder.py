@@ -0,0 +1,107 @@
+import os
+import re
+from typing import TYPE_CHECKING, List, Optional, Set
+
+from tokens import estimate_tokens, truncate_to_tokens
+
+if TYPE_CHECKING:
+    from langchain.schema import Document
+
+# Room for the three 1000-character chunks (~750 tokens) the stuff chain used to send;
+# the savings come from merging and deduplicating, not from dropping context
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "800"))
+# Chunks fetched from the store before merging and budgeting
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "5"))
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# Overlaps shorter than this are treated as coincidence
+MIN_OVERLAP_CHARS = 20
+# The splitter's chunk_overlap is 200; allow for separators it moved
+MAX_OVERLAP_CHARS = 400
+SHINGLE_WORDS = 5
+# A truncated last passage shorter than this is not worth sending
+MIN_PASSAGE_TOKENS = 50
+
+
+def merge_overlapping(first: str, second: str, max_overlap: int = MAX_OVERLAP_CHARS) -> Optional[str]:
+    """first and second joined once if second starts with the end of first, else None"""
+    if second in first:
+        return first
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    index = first.find(probe, max(0, len(first) - max_overlap))
+    while index != -1:
+        tail = first[index:]
+        if second.startswith(tail):
+            return first + second[len(tail):]
+        index = first.find(probe, index + 1)
+    return None
+
+
+def shingles(text: str) -> Set[tuple]:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+
+
+class Passage:
+    def __init__(self, text: str, source: Optional[str], pages: List[int]):
+        self.text = text
+        self.source = source
+        self.pages = pages
+
+
+def build_context(docs: List["Document"], max_tokens: int = CONTEXT_TOKEN_BUDGET,
+                  duplicate_threshold: float = NEAR_DUPLICATE_THRESHOLD) -> List["Document"]:
+    """Turn retrieved chunks, best first, into compact passages that fit max_tokens.
+
+    Chunks from the same file that overlap (as neighbouring chunks do by
+    the splitter's chunk_overlap) are merged into one passage, passages
+    whose word shingles mostly appear in a better-ranked one are dropped, and
+    passages are then taken in rank order until the budget is spent.
+    """
+    from langchain.schema import Document
+
+    passages: List[Passage] = []
+    for doc in docs:
+        source = doc.metadata.get("source")
+        page = doc.metadata.get("page")
+        for passage in passages:
+            if passage.source != source:
+                continue
+            merged = merge_overlapping(passage.text, doc.page_content) or merge_overlapping(doc.page_content, passage.text)
+            if merged is not None:
+                passage.text = merged
+                if page is not None and page not in passage.pages:
+                    passage.pages.append(page)
+                break
+        else:
+            passages.append(Passage(doc.page_content, source, [] if page is None else [page]))
+
+    kept: List[Passage] = []
+    kept_shingles: List[Set[tuple]] = []
+    for passage in passages:
+        passage_shingles = shingles(passage.text)
+        # Share of this passage's shingles that a better-ranked passage already covers
+        if any(len(passage_shingles & other) / len(passage_shingles) >= duplicate_threshold
+               for other in kept_shingles):
+            continue
+        kept.append(passage)
+        kept_shingles.append(passage_shingles)
+
+    context = []
+    remaining = max_tokens
+    for passage in kept:
+        text = passage.text
+        tokens = estimate_tokens(text)
+        if tokens > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+            text = truncate_to_tokens(text, remaining)
+            tokens = estimate_tokens(text)
+        metadata = {"pages": sorted(passage.pages)}
+        if passage.source is not None:
+            metadata["source"] = passage.source
+        context.append(Document(page_content=text, metadata=metadata))
+        remaining -= tokens
+    return context
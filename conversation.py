@@ -0,0 +1,93 @@
+import os
+import re
+from collections import deque
+from typing import Dict, Iterator, List
+
+from tokens import estimate_tokens, truncate_to_tokens
+
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "50"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "20"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1000"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "300"))
+
+# Longest piece of one message that goes into the model context
+MESSAGE_TOKEN_LIMIT = 400
+SUMMARY_LINE_TOKENS = 40
+# Words that point back at earlier turns, as in "why does it fail?" or "show that in Java"
+FOLLOW_UP_WORDS = {
+    "it", "its", "this", "that", "these", "those", "they", "them", "above", "previous", "earlier",
+    "again", "instead", "else", "more", "same", "also", "why", "you", "your",
+}
+# Questions shorter than this are read as follow-ups too, e.g. "and in C++?"
+STANDALONE_MIN_WORDS = 4
+
+
+class ConversationHistory:
+    """Chat messages of one session, kept to a fixed-size recent window.
+
+    Messages that fall out of the window are reduced to a one-line note
+    of the question asked, and the notes themselves are capped, so memory
+    and per-turn work stay flat however long the session runs.
+    """
+
+    def __init__(self, window: int = HISTORY_WINDOW, summary_tokens: int = SUMMARY_TOKEN_BUDGET):
+        self.messages: deque = deque(maxlen=window)
+        self.summary_tokens = summary_tokens
+        self.summary: deque = deque()
+        self.spilled = 0
+
+    def append(self, role: str, content: str):
+        if len(self.messages) == self.messages.maxlen:
+            self._spill(self.messages[0])
+        self.messages.append({"role": role, "content": content})
+
+    def _spill(self, message: Dict[str, str]):
+        self.spilled += 1
+        if message["role"] != "user":
+            return
+        self.summary.append(truncate_to_tokens(" ".join(message["content"].split()), SUMMARY_LINE_TOKENS))
+        while self.summary and sum(estimate_tokens(line) for line in self.summary) > self.summary_tokens:
+            self.summary.popleft()
+
+    def __len__(self) -> int:
+        return self.spilled + len(self.messages)
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        return iter(self.messages)
+
+    def tail(self, count: int) -> List[Dict[str, str]]:
+        """The last count messages still in the window"""
+        return list(self.messages)[-count:] if count > 0 else []
+
+    def context(self, max_tokens: int = HISTORY_TOKEN_BUDGET) -> str:
+        """Recent turns, newest first until max_tokens is reached, as prompt text.
+
+        Long messages are shortened, the newest one to max_tokens if it
+        does not fit otherwise, and the notes on older turns are included
+        if there is budget left.
+        """
+        lines = []
+        used = 0
+        for message in reversed(self.messages):
+            speaker = "Student" if message["role"] == "user" else "Tutor"
+            line = f"{speaker}: {truncate_to_tokens(message['content'], MESSAGE_TOKEN_LIMIT)}"
+            cost = estimate_tokens(line)
+            if used + cost > max_tokens:
+                if not lines and max_tokens > 1:
+                    # A follow-up needs at least the newest turn, even if cut short
+                    lines.append(truncate_to_tokens(line, max_tokens - 1))
+                break
+            lines.append(line)
+            used += cost
+        else:
+            if self.summary:
+                notes = "Earlier questions: " + "; ".join(self.summary)
+                if used + estimate_tokens(notes) <= max_tokens:
+                    lines.append(notes)
+        return "\n".join(reversed(lines))
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether question may refer to earlier turns; errs towards yes"""
+    words = re.findall(r"[a-z']+", question.lower())
+    return len(words) < STANDALONE_MIN_WORDS or any(word in FOLLOW_UP_WORDS for word in words)
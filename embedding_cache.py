@@ -0,0 +1,224 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+from metrics import metrics
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "100000"))
+# Seconds after which a row reserved by a writer that never finished may be reused
+PENDING_TIMEOUT = 60
+
+
+class EmbeddingCache:
+    """On-disk cache of embedding vectors for one model.
+
+    Vectors live in a memory-mapped float32 matrix; a SQLite table maps the
+    hash of (model, kind, text) to a row of that matrix and remembers when
+    it was last used. When all rows are taken, the least recently used
+    entries are evicted and their rows reused.
+    """
+
+    def __init__(self, model_name: str, directory: str = EMBEDDING_CACHE_DIR, capacity: int = EMBEDDING_CACHE_SIZE):
+        self.model_name = model_name
+        self.capacity = capacity
+        self.directory = os.path.join(directory, re.sub(r"[^\w.-]", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.matrix_path = os.path.join(self.directory, "vectors.f32")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.memmap] = None
+
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, slot INTEGER UNIQUE, last_used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        row = self._db.execute("SELECT value FROM meta WHERE name = 'dim'").fetchone()
+        self.dim = int(row[0]) if row else None
+        if self.dim is not None:
+            self._open_matrix()
+
+    def key(self, text: str, kind: str = "document") -> str:
+        """Cache key for a text embedded as a document or a query"""
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _open_matrix(self):
+        # Resize the backing file if the capacity setting changed since it was created
+        size = self.capacity * self.dim * np.dtype(np.float32).itemsize
+        with open(self.matrix_path, "ab") as f:
+            f.truncate(size)
+        self._db.execute("DELETE FROM entries WHERE slot >= ?", (self.capacity,))
+        self._db.commit()
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+
+    def get_many(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """Cached vectors for keys, None where missing"""
+        if self._matrix is None or not keys:
+            self._count(0, len(keys))
+            return [None] * len(keys)
+
+        with self._lock:
+            slots = self._lookup_slots(keys)
+            copied = {k: self._matrix[slot].tolist() for k, slot in slots.items()}
+            if slots:
+                # Another process may have evicted a row while it was copied;
+                # keep only the rows that still belong to the same key
+                current = self._lookup_slots(list(slots))
+                copied = {k: vector for k, vector in copied.items() if current.get(k) == slots[k]}
+                now = time.time()
+                self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ? AND last_used >= 0",
+                                     [(now, k) for k in copied])
+                self._db.commit()
+            vectors = [copied.get(k) for k in keys]
+
+        hits = sum(vector is not None for vector in vectors)
+        self._count(hits, len(keys) - hits)
+        return vectors
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """Store vectors, evicting the least recently used entries if full.
+
+        Processes sharing the directory coordinate through SQLite: rows are
+        reserved in one write transaction, marked pending by a negative
+        last_used, and only written and published once reserved.
+        """
+        if not keys:
+            return
+        with self._lock:
+            if self.dim is None:
+                self.dim = len(vectors[0])
+                self._db.execute("INSERT OR IGNORE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                self._open_matrix()
+
+            new_items = {}
+            for k, vector in zip(keys, vectors):
+                new_items.setdefault(k, vector)
+            reserved_at = time.time()
+            slots = self._reserve_slots(list(new_items), reserved_at)
+            if not slots:
+                return
+
+            for k, slot in slots.items():
+                self._matrix[slot] = np.asarray(new_items[k], dtype=np.float32)
+            self._matrix.flush()
+            now = time.time()
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ? AND slot = ? AND last_used = ?",
+                                 [(now, k, slot, -reserved_at) for k, slot in slots.items()])
+            self._db.commit()
+
+    def _reserve_slots(self, keys: List[str], reserved_at: float) -> Dict[str, int]:
+        """Claim rows for the keys no process has cached or is writing; callers hold the lock"""
+        # Rows left pending longer than this belong to a writer that died
+        stale = -(reserved_at - PENDING_TIMEOUT)
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            existing = self._lookup_slots(keys, include_pending=True)
+            slots = {k: slot for k, (slot, last_used) in existing.items() if stale <= last_used < 0}
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                 [(-reserved_at, k) for k in slots])
+            missing = [k for k in keys if k not in existing][:self.capacity]
+            for k, slot in zip(missing, self._free_slots(len(missing), stale)):
+                slots[k] = slot
+            self._db.executemany("INSERT INTO entries VALUES (?, ?, ?)",
+                                 [(k, slots[k], -reserved_at) for k in missing if k in slots])
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        return slots
+
+    def _lookup_slots(self, keys: List[str], include_pending: bool = False):
+        """Matrix rows of the keys that are cached; callers hold the lock.
+
+        With include_pending, rows still being written are included too,
+        mapped to (slot, last_used).
+        """
+        slots = {}
+        unique_keys = list(dict.fromkeys(keys))
+        condition = "" if include_pending else " AND last_used >= 0"
+        for start in range(0, len(unique_keys), 500):
+            batch = unique_keys[start:start + 500]
+            rows = self._db.execute(
+                f"SELECT key, slot, last_used FROM entries WHERE key IN ({','.join('?' * len(batch))}){condition}",
+                batch
+            ).fetchall()
+            slots.update((k, (slot, last_used) if include_pending else slot) for k, slot, last_used in rows)
+        return slots
+
+    def _free_slots(self, count: int, stale: float) -> List[int]:
+        """Rows available for count new vectors; callers hold the lock and a write transaction"""
+        count = min(count, self.capacity)
+        # Rows are handed out in order and evicted rows are reused at once,
+        # so the table never has gaps below its highest slot
+        next_slot = self._db.execute("SELECT COALESCE(MAX(slot) + 1, 0) FROM entries").fetchone()[0]
+        slots = list(range(next_slot, min(next_slot + count, self.capacity)))
+
+        shortfall = count - len(slots)
+        if shortfall > 0:
+            # Rows another process is still writing are not evictable
+            evicted = self._db.execute(
+                "SELECT key, slot FROM entries WHERE last_used >= ? ORDER BY last_used LIMIT ?", (stale, shortfall)
+            ).fetchall()
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k, _ in evicted])
+            slots.extend(slot for _, slot in evicted)
+            self.evictions += len(evicted)
+            metrics.increment("embedding_cache.evictions", len(evicted))
+        return slots
+
+    def _count(self, hits: int, misses: int):
+        self.hits += hits
+        self.misses += misses
+        metrics.increment("embedding_cache.hits", hits)
+        metrics.increment("embedding_cache.misses", misses)
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counts and current size"""
+        size = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": size,
+            "capacity": self.capacity,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that checks an EmbeddingCache before running the model"""
+
+    def __init__(self, base: Embeddings, cache: EmbeddingCache):
+        self.base = base
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with metrics.span("embedding.documents"):
+            keys = [self.cache.key(text) for text in texts]
+            vectors = self.cache.get_many(keys)
+            missing = [i for i, vector in enumerate(vectors) if vector is None]
+            if missing:
+                computed = self.base.embed_documents([texts[i] for i in missing])
+                self.cache.put_many([keys[i] for i in missing], computed)
+                for i, vector in zip(missing, computed):
+                    vectors[i] = list(vector)
+            return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with metrics.span("embedding.query"):
+            k = self.cache.key(text, kind="query")
+            vector = self.cache.get_many([k])[0]
+            if vector is None:
+                vector = list(self.base.embed_query(text))
+                self.cache.put_many([k], [vector])
+            return vector
@@ -0,0 +1,192 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))
+MODEL_DIRECTORY = os.getenv("MODEL_DIRECTORY", "./models")
+
+BACKENDS = ("sentence-transformers", "onnx", "onnx-int8", "hashing")
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic bag-of-words hashing embedder that needs no model files.
+
+    Retrieval quality is far below MiniLM; it exists so ingestion and
+    retrieval can be exercised offline, e.g. by the benchmarks.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[h % self.dim] += 1.0 if h >> 63 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformers model run through ONNX Runtime on the CPU.
+
+    The model is exported once into MODEL_DIRECTORY (and optionally
+    dynamically quantized to int8). Mean pooling and L2 normalization match
+    the sentence-transformers pipeline of all-MiniLM-L6-v2, so the vectors
+    can be searched against a collection built with HuggingFaceEmbeddings.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 num_threads: int = EMBEDDING_THREADS, quantize: bool = False,
+                 model_directory: str = MODEL_DIRECTORY, max_length: int = 256):
+        try:
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The ONNX embedding backend needs `pip install optimum[onnxruntime]`"
+            ) from e
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        export_dir = os.path.join(model_directory, model_name.replace("/", "_") + "-onnx")
+        file_name = "model_quantized.onnx" if quantize else "model.onnx"
+
+        if not os.path.exists(os.path.join(export_dir, "model.onnx")):
+            model = ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True)
+            model.save_pretrained(export_dir)
+            AutoTokenizer.from_pretrained(hub_name).save_pretrained(export_dir)
+        if quantize and not os.path.exists(os.path.join(export_dir, file_name)):
+            from optimum.onnxruntime import ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+            quantizer.quantize(
+                save_dir=export_dir,
+                quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+            )
+
+        session_options = onnxruntime.SessionOptions()
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            export_dir, file_name=file_name, session_options=session_options
+        )
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            hidden = np.asarray(self.model(**inputs).last_hidden_state)
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            vectors.extend(pooled.tolist())
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+
+def create_embeddings(model_name: str, backend: str = EMBEDDING_BACKEND,
+                      batch_size: int = EMBEDDING_BATCH_SIZE,
+                      num_threads: int = EMBEDDING_THREADS) -> Embeddings:
+    """Build the embedding model for a backend name from BACKENDS"""
+    if backend == "sentence-transformers":
+        from langchain.embeddings import HuggingFaceEmbeddings
+        if num_threads:
+            import torch
+            torch.set_num_threads(num_threads)
+        return HuggingFaceEmbeddings(model_name=model_name, encode_kwargs={"batch_size": batch_size})
+    if backend in ("onnx", "onnx-int8"):
+        return OnnxEmbeddings(model_name, batch_size, num_threads, quantize=backend == "onnx-int8")
+    if backend == "hashing":
+        return HashingEmbeddings()
+    raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def cache_name(model_name: str, backend: str) -> str:
+    """Name the embedding cache uses to keep each backend's vectors apart"""
+    return model_name if backend == "sentence-transformers" else f"{model_name}@{backend}"
+
+
+def compare_backends(baseline: Embeddings, candidate: Embeddings, texts: List[str],
+                     queries: List[str], k: int = 3) -> Dict[str, float]:
+    """Throughput of both backends and how closely the candidate agrees with the baseline.
+
+    Agreement is the mean cosine similarity between the two vectors of each
+    text, and the mean overlap of the top-k texts retrieved for each query.
+    """
+    results = {}
+    matrices = {}
+    for name, embeddings in (("baseline", baseline), ("candidate", candidate)):
+        start = time.perf_counter()
+        matrices[name] = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        elapsed = time.perf_counter() - start
+        results[f"{name}_chunks_per_sec"] = len(texts) / elapsed if elapsed else float("inf")
+        matrices[f"{name}_queries"] = np.asarray([embeddings.embed_query(q) for q in queries], dtype=np.float32)
+
+    def normalize(matrix):
+        return matrix / np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    baseline_docs, candidate_docs = normalize(matrices["baseline"]), normalize(matrices["candidate"])
+    results["mean_cosine"] = float((baseline_docs * candidate_docs).sum(axis=1).mean())
+
+    k = min(k, len(texts))
+    baseline_top = np.argsort(-normalize(matrices["baseline_queries"]) @ baseline_docs.T, axis=1)[:, :k]
+    candidate_top = np.argsort(-normalize(matrices["candidate_queries"]) @ candidate_docs.T, axis=1)[:, :k]
+    overlaps = [len(set(b) & set(c)) / k for b, c in zip(baseline_top, candidate_top)]
+    results[f"top{k}_agreement"] = float(np.mean(overlaps)) if overlaps else 0.0
+    results["speedup"] = results["candidate_chunks_per_sec"] / results["baseline_chunks_per_sec"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare an embedding backend against sentence-transformers")
+    parser.add_argument("texts", help="text file with one chunk per line")
+    parser.add_argument("queries", help="text file with one query per line")
+    parser.add_argument("--model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--backend", default="onnx-int8", choices=BACKENDS)
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("-k", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.texts, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+    with open(args.queries, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    baseline = create_embeddings(args.model, "sentence-transformers", args.batch_size, args.threads)
+    candidate = create_embeddings(args.model, args.backend, args.batch_size, args.threads)
+    print(json.dumps(compare_backends(baseline, candidate, texts, queries, args.k), indent=2))
+
+
+if __name__ == "__main__":
+    main()
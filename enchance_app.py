@@ -1,39 +1,126 @@
 import streamlit as st
-from app import CodingChatbot
-from code_executor import SafeCodeExecutor
+from app import PERSIST_DIRECTORY, CodingChatbot, gemini_api_key, show_collections, show_history, show_trace
+from snapshot import configured_snapshot
+from conversation import ConversationHistory
+from metrics import metrics
+from resources import get_execution_scheduler, warm_up
+import os
+import queue
 import re
+import time
+import uuid
+from typing import Iterator, List, Tuple
+
+CODE_BLOCK_PATTERN = re.compile(r"```[ \t]*([\w+#-]*)[^\n]*\n(.*?)```", re.DOTALL)
+LANGUAGE_ALIASES = {
+    "py": "python",
+    "python3": "python",
+    "c++": "cpp",
+    "cc": "cpp",
+    "js": "javascript",
+    "node": "javascript",
+}
+EXECUTION_DEADLINE = float(os.getenv("EXECUTION_DEADLINE", "30"))
 
 class EnhancedCodingChatbot(CodingChatbot):
     def __init__(self):
         super().__init__()
-        self.code_executor = SafeCodeExecutor()
+        self.session_id = uuid.uuid4().hex
     
-    def extract_code_blocks(self, text: str):
-        """Extract code blocks from markdown text"""
-        pattern = r'``````'
-        matches = re.findall(pattern, text, re.DOTALL)
-        return matches
+    @property
+    def scheduler(self):
+        """Executions from every session go through one shared scheduler, started on first run"""
+        return get_execution_scheduler()
     
-    def answer_with_code_execution(self, question: str) -> str:
-        """Generate answer and execute any code if requested"""
-        response = self.answer_question(question)
+    @property
+    def code_executor(self):
+        return self.scheduler.executor
+    
+    def extract_code_blocks(self, text: str) -> List[Tuple[str, str]]:
+        """Extract (language, code) pairs from fenced markdown code blocks"""
+        blocks = []
+        for lang, code in CODE_BLOCK_PATTERN.findall(text):
+            lang = lang.lower()
+            blocks.append((LANGUAGE_ALIASES.get(lang, lang), code))
+        return blocks
+    
+    def iter_code_execution_results(self, question: str, response: str,
+                                    deadline: float = EXECUTION_DEADLINE) -> Iterator[str]:
+        """Execute the code blocks in response if the user asked to run code.
         
+        Independent blocks run concurrently through the shared scheduler.
+        Results are yielded in block order, with each block's stdout streamed
+        while it runs. Blocks still running when the deadline for the whole
+        request passes are reported as timed out.
+        """
         # Check if user wants code execution
-        if "run" in question.lower() or "execute" in question.lower():
-            code_blocks = self.extract_code_blocks(response)
-            
-            if code_blocks:
-                response += "\n\n### Code Execution Results:\n"
-                for lang, code in code_blocks:
-                    if lang and code.strip():
-                        result = self.code_executor.execute_code(code, lang)
-                        response += f"\n**{lang.upper()} Output:**\n"
-                        if result["success"]:
-                            response += f"``````"
-                        else:
-                            response += f"``````"
+        if "run" not in question.lower() and "execute" not in question.lower():
+            return
+        # Blocks such as ```text or ```bash are shown, not run
+        supported = self.code_executor.supported_languages
+        code_blocks = [(lang, code) for lang, code in self.extract_code_blocks(response)
+                       if lang in supported and code.strip()]
+        if not code_blocks:
+            return
+        
+        outputs = [queue.Queue() for _ in code_blocks]
+        futures = [
+            self.scheduler.submit(code, lang, self.session_id, on_output=self._stdout_to(output))
+            for (lang, code), output in zip(code_blocks, outputs)
+        ]
+        deadline_at = time.monotonic() + deadline
         
-        return response
+        yield "\n\n### Code Execution Results:\n"
+        for (lang, code), future, output in zip(code_blocks, futures, outputs):
+            yield f"\n**{lang.upper()} Output:**\n```\n"
+            last = "\n"
+            while True:
+                finished = future.done()
+                try:
+                    while True:
+                        last = output.get_nowait()
+                        yield last
+                except queue.Empty:
+                    pass
+                if finished or time.monotonic() >= deadline_at:
+                    break
+                time.sleep(0.05)
+            yield "```\n" if last.endswith("\n") else "\n```\n"
+            
+            if not future.done():
+                future.cancel()
+                yield f"```\nNot finished within the {deadline} second limit for this request\n```\n"
+                continue
+            result = future.result()
+            if not result["success"] and result["error"]:
+                yield f"```\n{result['error']}\n```\n"
+    
+    @staticmethod
+    def _stdout_to(output: queue.Queue):
+        def on_output(stream: str, text: str):
+            if stream == "stdout":
+                output.put(text)
+        return on_output
+    
+    def code_execution_results(self, question: str, response: str) -> str:
+        """Execute the code blocks in response if the user asked to run code"""
+        return "".join(self.iter_code_execution_results(question, response))
+    
+    def answer_with_code_execution(self, question: str, history: str = "") -> str:
+        """Generate answer and execute any code if requested"""
+        response = self.answer_question(question, history)
+        return response + self.code_execution_results(question, response)
+    
+    def stream_with_code_execution(self, question: str, history: str = "") -> Iterator[str]:
+        """Stream the answer tokens, then the output of any executed code as it runs"""
+        with metrics.trace("answer_with_code") as trace:
+            self.last_trace = trace
+            tokens = []
+            for token in self.stream_answer(question, history):
+                tokens.append(token)
+                yield token
+            
+            yield from self.iter_code_execution_results(question, "".join(tokens))
 
 def main():
     st.set_page_config(
@@ -45,12 +132,15 @@ def main():
     st.title("🚀 Enhanced AI Coding Tutor")
     st.markdown("Upload PDFs, ask questions, and execute code - all for free!")
     
+    # Load shared models once per server process
+    warm_up(api_key=gemini_api_key(), persist_directory=PERSIST_DIRECTORY, snapshot_directory=configured_snapshot())
+    
     # Initialize enhanced chatbot
     if 'chatbot' not in st.session_state:
         st.session_state.chatbot = EnhancedCodingChatbot()
     
     if 'messages' not in st.session_state:
-        st.session_state.messages = []
+        st.session_state.messages = ConversationHistory()
     
     # Sidebar
     with st.sidebar:
@@ -64,6 +154,7 @@ def main():
         """)
         
         st.header("📚 Upload Training PDFs")
+        show_collections(st.session_state.chatbot, "collections")
         uploaded_files = st.file_uploader(
             "Choose PDF files",
             type="pdf",
@@ -76,23 +167,25 @@ def main():
                 st.session_state.chatbot.create_vector_store(text_chunks)
                 st.session_state.chatbot.setup_qa_chain()
                 st.success("✅ PDFs processed!")
+        
+        st.checkbox("Show timing breakdown", key="show_trace")
     
     # Main interface
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.markdown(message["content"])
+    show_history(st.session_state.messages, "messages")
     
     if prompt := st.chat_input("Ask anything about coding..."):
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        history = st.session_state.messages.context()
+        st.session_state.messages.append("user", prompt)
         with st.chat_message("user"):
             st.markdown(prompt)
         
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Thinking..."):
-                response = st.session_state.chatbot.answer_with_code_execution(prompt)
-                st.markdown(response)
+            response = st.write_stream(st.session_state.chatbot.stream_with_code_execution(prompt, history))
         
-        st.session_state.messages.append({"role": "assistant", "content": response})
+        st.session_state.messages.append("assistant", response)
+    
+    if st.session_state.get("show_trace"):
+        show_trace(st.session_state.chatbot.last_trace)
 
 if __name__ == "__main__":
     main()
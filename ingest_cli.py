@@ -0,0 +1,94 @@
+"""Build or extend a persisted collection from a directory of PDFs, outside the web app.
+
+    python ingest_cli.py ./course_pdfs --persist-directory ./chroma_db --workers 8
+    python ingest_cli.py ./cs101_pdfs --namespace course/cs101
+
+Every file is checkpointed in the ingestion manifest as soon as its chunks
+are stored, so an interrupted run picks up at the first unfinished file
+when started again. A running app notices the rewritten manifest on its
+next question and reopens the collection, no restart needed. Avoid
+uploading through the app into the same directory while a run is going.
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Iterator, List
+
+from app import PERSIST_DIRECTORY, CodingChatbot
+from ingestion import hash_bytes
+from namespaces import open_namespace
+
+
+class LocalPDF:
+    """A PDF on disk that looks like an upload, read only when processed"""
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+
+    def getvalue(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+def find_pdfs(directory: str, recursive: bool = True) -> List[LocalPDF]:
+    """PDFs under directory in a stable order, named by their relative path"""
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(".pdf"))
+        if not recursive:
+            break
+    return [LocalPDF(path, os.path.relpath(path, directory)) for path in paths]
+
+
+def iter_groups(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest a directory of PDFs into the vector store")
+    parser.add_argument("directory", help="directory to search for PDFs")
+    parser.add_argument("--persist-directory", default=PERSIST_DIRECTORY)
+    parser.add_argument("--namespace", help="ingest into a namespace such as course/cs101 instead")
+    parser.add_argument("--backend", help="embedding backend, defaults to EMBEDDING_BACKEND")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="PDF parsing processes")
+    parser.add_argument("--group-size", type=int, default=16,
+                        help="files handed to the pipeline at once; progress is reported per group")
+    parser.add_argument("--no-recursive", action="store_true", help="only read the top-level directory")
+    args = parser.parse_args()
+
+    if args.namespace:
+        try:
+            args.persist_directory = open_namespace(args.namespace)
+        except ValueError as e:
+            parser.error(str(e))
+    files = find_pdfs(args.directory, recursive=not args.no_recursive)
+    chatbot = CodingChatbot(persist_directory=args.persist_directory, embedding_backend=args.backend,
+                            snapshot_directory="")
+    pending = [f for f in files if not chatbot.manifest.is_current(f.name, hash_bytes(f.getvalue()))]
+    print(f"{len(files)} PDFs found, {len(files) - len(pending)} already ingested", file=sys.stderr)
+
+    errors = []
+
+    def on_error(source: str, message: str):
+        errors.append(source)
+        print(f"error: {source}: {message}", file=sys.stderr)
+
+    start = time.perf_counter()
+    done = 0
+    for group in iter_groups(pending, args.group_size):
+        chatbot.create_vector_store(chatbot.process_pdfs(group, max_workers=args.workers, on_error=on_error))
+        done += len(group)
+        elapsed = time.perf_counter() - start
+        print(f"[{done}/{len(pending)}] {elapsed:.0f}s, {done / elapsed:.2f} files/s", file=sys.stderr)
+
+    print(f"{len(chatbot.manifest.files)} files in {args.persist_directory}, "
+          f"manifest version {chatbot.manifest.version}", file=sys.stderr)
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
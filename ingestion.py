@@ -0,0 +1,243 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from metrics import metrics
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+PAGES_PER_TASK = 8
+EMBED_BATCH_SIZE = 64
+# Extraction workers start from a clean process instead of a fork of the
+# threaded server, whose locks may be held by other threads at fork time
+POOL_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def hash_bytes(data: bytes) -> str:
+    """Content hash used to key uploaded files"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_text(text: str) -> str:
+    """Content hash used as the vector id of a chunk"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_pdf_bytes(pdf_file) -> bytes:
+    """Return the raw bytes of an uploaded file or file-like object"""
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    pdf_file.seek(0)
+    return pdf_file.read()
+
+
+class IngestionManifest:
+    """Records which files and chunks are already embedded in a persist directory.
+
+    Each source file maps to the hash of its bytes and the ids of the chunks it
+    produced, so unchanged uploads can be skipped and changed ones replaced.
+    deleted_chunks counts chunks deleted from the store since it was last
+    rebuilt, which tells compaction how fragmented it is.
+    """
+
+    def __init__(self, persist_directory: str):
+        self.path = os.path.join(persist_directory, MANIFEST_FILENAME)
+        self.files: Dict[str, Dict] = {}
+        self.deleted_chunks = 0
+        self._mtime: Optional[int] = None
+        self._lock = threading.Lock()
+        self.load()
+
+    def _stat_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        """Read the manifest from disk, starting empty if it does not exist"""
+        self._mtime = self._stat_mtime()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.deleted_chunks = data.get("deleted_chunks", 0)
+        except (OSError, ValueError):
+            self.files = {}
+            self.deleted_chunks = 0
+
+    def reload_if_changed(self) -> bool:
+        """Reload if another process, such as ingest_cli.py, rewrote the manifest"""
+        if self._stat_mtime() == self._mtime:
+            return False
+        with self._lock:
+            self.load()
+        return True
+
+    def save(self):
+        """Atomically write the manifest next to the vector store"""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"files": self.files, "deleted_chunks": self.deleted_chunks}, f)
+            os.replace(tmp_path, self.path)
+            self._mtime = self._stat_mtime()
+
+    def is_current(self, source: str, file_hash: str) -> bool:
+        """True if this exact file content has already been ingested"""
+        entry = self.files.get(source)
+        return entry is not None and entry["file_hash"] == file_hash
+
+    def has_file_hash(self, file_hash: str) -> bool:
+        """True if a file with this content was ingested, under any name"""
+        return any(entry["file_hash"] == file_hash for entry in self.files.values())
+
+    def referenced_ids(self, exclude_source: Optional[str] = None) -> Set[str]:
+        """All chunk ids referenced by files other than exclude_source"""
+        ids = set()
+        for source, entry in self.files.items():
+            if source != exclude_source:
+                ids.update(entry["chunk_ids"])
+        return ids
+
+    def stale_ids(self, source: str, chunk_ids: List[str]) -> List[str]:
+        """Ids previously stored for source that are no longer needed by any file"""
+        entry = self.files.get(source)
+        if entry is None:
+            return []
+        keep = set(chunk_ids) | self.referenced_ids(exclude_source=source)
+        return [chunk_id for chunk_id in entry["chunk_ids"] if chunk_id not in keep]
+
+    def record(self, source: str, file_hash: str, chunk_ids: List[str]):
+        """Remember the chunks stored for a file"""
+        with self._lock:
+            self.files[source] = {"file_hash": file_hash, "chunk_ids": list(chunk_ids)}
+
+    def record_deleted(self, count: int):
+        """Count chunks deleted from the store, until compaction rebuilds it"""
+        with self._lock:
+            self.deleted_chunks += count
+
+    @property
+    def version(self) -> str:
+        """Digest that changes whenever the set of ingested files changes"""
+        digest = hashlib.sha256()
+        for source in sorted(self.files):
+            digest.update(source.encode("utf-8"))
+            digest.update(self.files[source]["file_hash"].encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+
+class PendingFile(NamedTuple):
+    source: str
+    file_hash: str
+    path: str
+
+
+class PageText(NamedTuple):
+    source: str
+    file_hash: str
+    page: int
+    text: str
+
+
+def _count_pages(path: str) -> int:
+    import PyPDF2
+    return len(PyPDF2.PdfReader(path).pages)
+
+
+def _extract_page_range(path: str, start: int, end: int) -> Tuple[List[Tuple[int, str]], Optional[str], float]:
+    """Extract pages [start, end) of a PDF; runs inside a worker process.
+
+    Also returns the seconds spent, so the parent can record the stage.
+    """
+    import PyPDF2
+    began = time.perf_counter()
+    pages = []
+    try:
+        reader = PyPDF2.PdfReader(path)
+        for index in range(start, end):
+            pages.append((index + 1, reader.pages[index].extract_text() or ""))
+    except Exception as e:
+        return pages, str(e), time.perf_counter() - began
+    return pages, None, time.perf_counter() - began
+
+
+def iter_pdf_pages(
+    files: List[PendingFile],
+    max_workers: Optional[int] = None,
+    pages_per_task: int = PAGES_PER_TASK,
+    on_error: Optional[Callable[[str, str], None]] = None,
+    on_file_done: Optional[Callable[[PendingFile], None]] = None,
+) -> Iterator[PageText]:
+    """Extract pages in a process pool and yield them in document order.
+
+    Only a bounded window of page ranges is in flight at once, so the pool
+    keeps parsing ahead while the caller splits and embeds earlier pages,
+    and memory does not grow with the size of the upload.
+    on_file_done(file) is called after the last page of a file that was
+    read without errors, including files without any text.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_workers * 2
+    # source -> page ranges not yet yielded, for files without errors so far
+    remaining: Dict[str, int] = {}
+
+    def tasks():
+        for pending_file in files:
+            try:
+                page_count = _count_pages(pending_file.path)
+            except Exception as e:
+                if on_error:
+                    on_error(pending_file.source, str(e))
+                continue
+            remaining[pending_file.source] = -(-page_count // pages_per_task)
+            if not page_count and on_file_done:
+                on_file_done(pending_file)
+            for start in range(0, page_count, pages_per_task):
+                yield pending_file, start, min(start + pages_per_task, page_count)
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(POOL_START_METHOD)) as executor:
+        task_iter = tasks()
+        in_flight = deque()
+        while True:
+            for pending_file, start, end in task_iter:
+                in_flight.append((pending_file, executor.submit(_extract_page_range, pending_file.path, start, end)))
+                if len(in_flight) >= max_pending:
+                    break
+            if not in_flight:
+                return
+
+            pending_file, future = in_flight.popleft()
+            pages, error, seconds = future.result()
+            metrics.record_span("pdf.extract", seconds)
+            if error:
+                remaining.pop(pending_file.source, None)
+                if on_error:
+                    on_error(pending_file.source, error)
+            for page, text in pages:
+                yield PageText(pending_file.source, pending_file.file_hash, page, text)
+            if pending_file.source in remaining:
+                remaining[pending_file.source] -= 1
+                if not remaining[pending_file.source]:
+                    del remaining[pending_file.source]
+                    if on_file_done:
+                        on_file_done(pending_file)
+
+
+def iter_batches(items, batch_size: int = EMBED_BATCH_SIZE) -> Iterator[List]:
+    """Group an iterable into lists of at most batch_size items"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from metrics import metrics
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1.0"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+
+THROTTLING_ERRORS = ("ResourceExhausted", "TooManyRequests", "RateLimitError", "ServiceUnavailable")
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """True for quota and overload errors that are worth retrying later"""
+    for e in (error, error.__cause__):
+        if e is None:
+            continue
+        if type(e).__name__ in THROTTLING_ERRORS:
+            return True
+        if getattr(e, "code", None) in (429, 503) or getattr(e, "status_code", None) in (429, 503):
+            return True
+        message = str(e).lower()
+        if "429" in message or "resource has been exhausted" in message or "quota" in message:
+            return True
+    return False
+
+
+def prompt_key(prompt) -> str:
+    """Identity of a prompt string or PromptValue for coalescing"""
+    text = prompt if isinstance(prompt, str) else prompt.to_string()
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SharedStream:
+    """Chunks of one streamed completion, replayed to every caller that joins it"""
+
+    def __init__(self):
+        self.chunks: List[Any] = []
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self._cond = threading.Condition()
+
+    def put(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def __iter__(self) -> Iterator[Any]:
+        index = 0
+        while True:
+            with self._cond:
+                while index == len(self.chunks) and not self.done:
+                    self._cond.wait()
+                chunks = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(chunks)
+            yield from chunks
+            if done and index == len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class LLMGateway:
+    """Process-wide front for a chat model shared by all sessions.
+
+    Calls are scheduled on one asyncio loop in a background thread. At most
+    max_concurrency requests reach the model at once, throttling errors are
+    retried with exponential backoff and jitter, and callers asking for the
+    same prompt while it is in flight share one request. invoke() and
+    stream() block the calling thread like the model's own methods do.
+    """
+
+    def __init__(self, llm, max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 base_delay: float = LLM_RETRY_BASE_DELAY, max_delay: float = LLM_RETRY_MAX_DELAY):
+        self.llm = llm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # Reentrant: a future that is already done runs its callback on add
+        self._lock = threading.RLock()
+        self._calls: Dict[str, Future] = {}
+        self._streams: Dict[str, SharedStream] = {}
+        self._in_flight = 0
+
+        # Model calls are blocking, so they run on a pool sized to the cap;
+        # waiting callers and backoff sleeps only cost a coroutine
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(self._executor)
+        threading.Thread(target=self._loop.run_forever, name="llm-gateway", daemon=True).start()
+        self._semaphore = asyncio.run_coroutine_threadsafe(self._make_semaphore(), self._loop).result()
+
+    async def _make_semaphore(self) -> asyncio.Semaphore:
+        return asyncio.Semaphore(self.max_concurrency)
+
+    def __bool__(self):
+        return self.llm is not None
+
+    def invoke(self, prompt):
+        """Model response for prompt, sharing the request with identical in-flight prompts"""
+        key = prompt_key(prompt)
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = asyncio.run_coroutine_threadsafe(self._invoke(prompt), self._loop)
+                self._calls[key] = future
+                future.add_done_callback(lambda _: self._forget(self._calls, key, future))
+            else:
+                metrics.increment("llm_gateway.coalesced")
+        return future.result()
+
+    def stream(self, prompt) -> Iterator[Any]:
+        """Response chunks for prompt; callers joining an identical stream get all chunks from the start"""
+        key = prompt_key(prompt)
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None:
+                shared = SharedStream()
+                self._streams[key] = shared
+                asyncio.run_coroutine_threadsafe(self._stream(prompt, key, shared), self._loop)
+            else:
+                metrics.increment("llm_gateway.coalesced")
+        return iter(shared)
+
+    def _forget(self, table: Dict, key: str, value):
+        with self._lock:
+            if table.get(key) is value:
+                del table[key]
+
+    async def _invoke(self, prompt):
+        async with self._slot():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    return await self._loop.run_in_executor(None, self.llm.invoke, prompt)
+                except Exception as e:
+                    if attempt == self.max_retries or not is_throttling_error(e):
+                        metrics.increment("llm_gateway.errors")
+                        raise
+                    await self._backoff(attempt)
+
+    async def _stream(self, prompt, key: str, shared: SharedStream):
+        try:
+            async with self._slot():
+                for attempt in range(self.max_retries + 1):
+                    try:
+                        await self._loop.run_in_executor(None, self._drain, prompt, shared)
+                        break
+                    except Exception as e:
+                        # Once chunks went out a retry would repeat them
+                        if shared.chunks or attempt == self.max_retries or not is_throttling_error(e):
+                            raise
+                        await self._backoff(attempt)
+        except BaseException as e:
+            metrics.increment("llm_gateway.errors")
+            self._forget(self._streams, key, shared)
+            shared.finish(e)
+        else:
+            self._forget(self._streams, key, shared)
+            shared.finish()
+
+    def _drain(self, prompt, shared: SharedStream):
+        for chunk in self.llm.stream(prompt):
+            shared.put(chunk)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the max_concurrency request slots"""
+        async with self._semaphore:
+            self._in_flight += 1
+            metrics.set_gauge("llm_gateway.in_flight", self._in_flight)
+            try:
+                yield
+            finally:
+                self._in_flight -= 1
+                metrics.set_gauge("llm_gateway.in_flight", self._in_flight)
+
+    async def _backoff(self, attempt: int):
+        """Sleep before retry number attempt + 1, holding the slot to ease the pressure"""
+        metrics.increment("llm_gateway.throttled")
+        delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+        await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "coalescing_calls": len(self._calls),
+                "coalescing_streams": len(self._streams),
+            }
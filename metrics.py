@@ -0,0 +1,236 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+METRICS_JSONL = os.getenv("METRICS_JSONL", "")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+
+class Span(NamedTuple):
+    name: str
+    start: float
+    duration: float
+    depth: int
+
+
+class Trace:
+    """Spans recorded while handling one request, across threads"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans: List[Span] = []
+        self.attributes: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float, depth: int):
+        with self._lock:
+            self.spans.append(Span(name, start - self._start, duration, depth))
+
+    def breakdown(self) -> List[Dict[str, Any]]:
+        """Spans in start order as rows for display"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return [
+            {"stage": "  " * span.depth + span.name, "start_ms": span.start * 1000, "duration_ms": span.duration * 1000}
+            for span in spans
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span._asdict() for span in self.spans]
+        return {
+            "trace": self.name,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "attributes": dict(self.attributes),
+            "spans": spans,
+        }
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+_span_depth: contextvars.ContextVar = contextvars.ContextVar("span_depth", default=0)
+
+
+def _reset(var: contextvars.ContextVar, token: contextvars.Token):
+    # A generator closed from another context cannot restore the caller's value
+    try:
+        var.reset(token)
+    except ValueError:
+        pass
+
+
+class Metrics:
+    """Thread-safe counters and timings shared by every session in the process"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS, jsonl_path: str = METRICS_JSONL):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.jsonl_path = jsonl_path
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.timings: Dict[str, Dict[str, Any]] = {}
+
+    def increment(self, name: str, value: float = 1):
+        """Add value to a counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """Record the current value of a level such as a queue depth"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float):
+        """Record one duration for a timing"""
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = {
+                    "count": 0, "total": 0.0, "max": 0.0, "last": 0.0, "buckets": [0] * len(self.buckets)
+                }
+            timing["count"] += 1
+            timing["total"] += seconds
+            timing["max"] = max(timing["max"], seconds)
+            timing["last"] = seconds
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    timing["buckets"][i] += 1
+                    break
+
+    @contextmanager
+    def timer(self, name: str):
+        """Time the body of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    @contextmanager
+    def span(self, name: str):
+        """Time the body of a with-block and add it to the current trace, if any"""
+        start = time.perf_counter()
+        depth = _span_depth.get()
+        token = _span_depth.set(depth + 1)
+        try:
+            yield
+        finally:
+            _reset(_span_depth, token)
+            self.record_span(name, time.perf_counter() - start, depth=depth)
+
+    def record_span(self, name: str, seconds: float, depth: Optional[int] = None):
+        """Record a stage timed elsewhere, such as in a worker process, as ending now"""
+        self.observe(name, seconds)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, time.perf_counter() - seconds, seconds, _span_depth.get() if depth is None else depth)
+
+    def annotate(self, key: str, value: Any):
+        """Attach a value, such as a token count, to the current trace, if any"""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.attributes[key] = value
+
+    @contextmanager
+    def trace(self, name: str) -> Iterator[Trace]:
+        """Collect the spans of one request.
+
+        Nested calls join the trace that is already active, so a request
+        handler and the methods it calls can each open one. The finished
+        trace is appended to METRICS_JSONL when that is set.
+        """
+        active = _current_trace.get()
+        if active is not None:
+            with self.span(name):
+                yield active
+            return
+
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _reset(_current_trace, token)
+            trace.duration = time.perf_counter() - trace._start
+            self.observe(f"trace.{name}", trace.duration)
+            if self.jsonl_path:
+                self._append_jsonl(trace.to_dict())
+
+    def _append_jsonl(self, record: Dict[str, Any]):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Copy of all counters and timings"""
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "timings": {name: dict(timing, buckets=list(timing["buckets"])) for name, timing in self.timings.items()},
+            }
+
+    def render_prometheus(self, prefix: str = "codex") -> str:
+        """All metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric_name(name: str) -> str:
+            return f"{prefix}_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+        for name, value in sorted(snapshot["counters"].items()):
+            name = metric_name(name) + "_total"
+            lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        for name, value in sorted(snapshot["gauges"].items()):
+            name = metric_name(name)
+            lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+        for name, timing in sorted(snapshot["timings"].items()):
+            name = metric_name(name) + "_seconds"
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(self.buckets, timing["buckets"]):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {timing["count"]}')
+            lines += [f"{name}_sum {timing['total']}", f"{name}_count {timing['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = METRICS_PORT, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """Serve render_prometheus() at /metrics from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+
+metrics = Metrics()
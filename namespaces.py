@@ -0,0 +1,230 @@
+"""Namespaced collections under NAMESPACE_ROOT, with expiry and compaction.
+
+A namespace such as "course/cs101", "user/alice" or "session/3f2a..." is
+its own persist directory (vector store plus ingestion manifest), so a
+search only pays for the collections a session picked. The shared
+PERSIST_DIRECTORY collection stays outside the root under the name
+"shared". namespace.json in each directory records when it was created
+and last used; session namespaces expire SESSION_TTL_HOURS after their
+last use.
+
+A maintenance pass, run every NAMESPACE_MAINTENANCE_INTERVAL seconds by
+the app, deletes expired namespaces and rebuilds stores in which at least
+COMPACTION_MIN_DEAD_SHARE of the chunks have been deleted. It only
+coordinates with writers in the same process, so run it in one replica
+per volume.
+"""
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from ingestion import IngestionManifest
+from metrics import metrics
+from resources import forget_chroma_client, get_manifest, get_vector_store, registry, reload_vector_stores
+
+NAMESPACE_ROOT = os.getenv("NAMESPACE_ROOT", "./collections")
+SESSION_TTL = float(os.getenv("SESSION_TTL_HOURS", "24")) * 3600
+NAMESPACE_MAINTENANCE_INTERVAL = float(os.getenv("NAMESPACE_MAINTENANCE_INTERVAL", "600"))
+COMPACTION_MIN_DEAD_SHARE = float(os.getenv("COMPACTION_MIN_DEAD_SHARE", "0.25"))
+NAMESPACE_KINDS = ("course", "user", "session")
+NAMESPACE_FILENAME = "namespace.json"
+SHARED = "shared"
+# last_used is rewritten at most this often per namespace
+TOUCH_INTERVAL = 60
+
+_NAME_PATTERN = re.compile(r"^({})/\w[\w.-]{{0,63}}$".format("|".join(NAMESPACE_KINDS)))
+_last_touched: Dict[str, float] = {}
+
+
+def check_namespace(name: str) -> str:
+    if not _NAME_PATTERN.match(name):
+        raise ValueError(f"Invalid namespace {name!r}, expected <{'|'.join(NAMESPACE_KINDS)}>/<name>")
+    return name
+
+
+def namespace_directory(name: str, root: str = NAMESPACE_ROOT) -> str:
+    return os.path.join(root, *check_namespace(name).split("/"))
+
+
+def is_session_namespace(name: str) -> bool:
+    return name.startswith("session/")
+
+
+def new_session_namespace() -> str:
+    return f"session/{os.urandom(8).hex()}"
+
+
+def _write_info(directory: str, info: Dict):
+    tmp_path = os.path.join(directory, NAMESPACE_FILENAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    os.replace(tmp_path, os.path.join(directory, NAMESPACE_FILENAME))
+
+
+def read_info(directory: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(directory, NAMESPACE_FILENAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def open_namespace(name: str, root: str = NAMESPACE_ROOT) -> str:
+    """Directory of namespace name, created on first use; also marks it as used"""
+    directory = namespace_directory(name, root)
+    if read_info(directory) is None:
+        os.makedirs(directory, exist_ok=True)
+        now = time.time()
+        _write_info(directory, {
+            "name": name,
+            "created": now,
+            "last_used": now,
+            "ttl": SESSION_TTL if is_session_namespace(name) else None,
+        })
+        _last_touched[directory] = now
+    else:
+        touch(directory)
+    return directory
+
+
+def touch(directory: str):
+    """Postpone the expiry of the namespace in directory, if it is one"""
+    now = time.time()
+    if now - _last_touched.get(directory, 0) < TOUCH_INTERVAL:
+        return
+    _last_touched[directory] = now
+    info = read_info(directory)
+    if info is not None:
+        info["last_used"] = now
+        _write_info(directory, info)
+
+
+def list_namespaces(root: str = NAMESPACE_ROOT) -> List[str]:
+    """Names of the namespaces under root, sorted"""
+    names = []
+    for kind in NAMESPACE_KINDS:
+        try:
+            entries = os.scandir(os.path.join(root, kind))
+        except OSError:
+            continue
+        with entries:
+            names.extend(f"{kind}/{entry.name}" for entry in entries
+                         if entry.is_dir() and _NAME_PATTERN.match(f"{kind}/{entry.name}"))
+    return sorted(names)
+
+
+def expire_namespaces(root: str = NAMESPACE_ROOT, now: Optional[float] = None) -> List[str]:
+    """Delete namespaces whose ttl has passed since their last use; returns their names"""
+    now = time.time() if now is None else now
+    expired = []
+    for name in list_namespaces(root):
+        directory = namespace_directory(name, root)
+        # A directory opened before its first upload has no info yet
+        info = read_info(directory) or {
+            "last_used": os.path.getmtime(directory),
+            "ttl": SESSION_TTL if is_session_namespace(name) else None,
+        }
+        if info.get("ttl") is None or info["last_used"] + info["ttl"] > now:
+            continue
+        with registry.lock(directory):
+            shutil.rmtree(directory, ignore_errors=True)
+            # Sessions share the manifest object, which now reads as empty
+            get_manifest(directory).load()
+            reload_vector_stores(directory)
+        _last_touched.pop(directory, None)
+        expired.append(name)
+        metrics.increment("namespaces.expired")
+    return expired
+
+
+def dead_share(manifest: IngestionManifest) -> float:
+    """Share of the stored chunks that were deleted since the last rebuild"""
+    live = len(manifest.referenced_ids())
+    total = live + manifest.deleted_chunks
+    return manifest.deleted_chunks / total if total else 0.0
+
+
+def compact(directory: str, min_dead_share: float = COMPACTION_MIN_DEAD_SHARE) -> bool:
+    """Rebuild the store in directory without its deleted chunks, if enough of it is dead.
+
+    The new store is built next to the old one and swapped in; handles
+    still open on the old files keep working until they are reopened.
+    """
+    from vector_index import INDEX_DIRNAME, MmapVectorStore, copy_chunks
+
+    manifest = get_manifest(directory)
+    if manifest.reload_if_changed():
+        # As the sessions would, had they seen the change first
+        reload_vector_stores(directory)
+    if not manifest.deleted_chunks or dead_share(manifest) < min_dead_share:
+        return False
+
+    vector_backend = "mmap" if os.path.isdir(os.path.join(directory, INDEX_DIRNAME)) else "chroma"
+    rebuilt = directory.rstrip(os.sep) + ".compacting"
+    retired = directory.rstrip(os.sep) + ".retired"
+    with registry.lock(directory), metrics.timer("namespaces.compact"):
+        source = get_vector_store(directory, vector_backend=vector_backend)
+        shutil.rmtree(rebuilt, ignore_errors=True)
+        try:
+            if vector_backend == "mmap":
+                target = MmapVectorStore(os.path.join(rebuilt, INDEX_DIRNAME), source.embeddings)
+                copy_chunks(source, target)
+                target.trim()
+                target.close()
+            else:
+                from langchain.vectorstores import Chroma
+                target = Chroma(persist_directory=rebuilt, embedding_function=source.embeddings)
+                copy_chunks(source, target)
+                target.persist()
+            copied = IngestionManifest(rebuilt)
+            copied.files = manifest.files
+            copied.save()
+            if os.path.exists(os.path.join(directory, NAMESPACE_FILENAME)):
+                shutil.copyfile(os.path.join(directory, NAMESPACE_FILENAME), os.path.join(rebuilt, NAMESPACE_FILENAME))
+        except BaseException:
+            shutil.rmtree(rebuilt, ignore_errors=True)
+            forget_chroma_client(rebuilt)
+            raise
+        os.rename(directory, retired)
+        os.rename(rebuilt, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+        # The client chromadb cached for the build path points at a path that is gone
+        forget_chroma_client(rebuilt)
+        manifest.load()
+        # Evicts chromadb's client for this directory only; other collections keep theirs
+        reload_vector_stores(directory)
+    metrics.increment("namespaces.compacted")
+    return True
+
+
+def run_maintenance(directories: Iterable[str] = (), root: str = NAMESPACE_ROOT):
+    """Expire namespaces, then compact the remaining ones and the given directories"""
+    expire_namespaces(root)
+    for directory in [namespace_directory(name, root) for name in list_namespaces(root)] + list(directories):
+        if not os.path.exists(directory):
+            continue
+        try:
+            compact(directory)
+        except Exception:
+            metrics.increment("namespaces.compaction_errors")
+
+
+def start_maintenance(directories: Iterable[str] = (), interval: float = NAMESPACE_MAINTENANCE_INTERVAL,
+                      root: str = NAMESPACE_ROOT) -> threading.Thread:
+    """Run run_maintenance every interval seconds on a daemon thread"""
+    directories = list(directories)
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                run_maintenance(directories, root)
+            except Exception:
+                metrics.increment("namespaces.maintenance_errors")
+    thread = threading.Thread(target=loop, name="namespace-maintenance", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,296 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from ingestion import IngestionManifest
+from metrics import METRICS_PORT, metrics
+
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_LLM_MODEL = "gemini-1.5-flash"
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+VECTOR_BACKENDS = ("chroma", "mmap")
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+
+
+class ResourceRegistry:
+    """Process-wide cache of expensive objects shared by all Streamlit sessions.
+
+    Each resource is built once under its own lock, so concurrent sessions
+    asking for the same model wait for a single load instead of each
+    loading a copy.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resources: Dict[str, Any] = {}
+        self._key_locks: Dict[str, threading.Lock] = {}
+        self._write_locks: Dict[str, threading.Lock] = {}
+        self.load_times: Dict[str, float] = {}
+
+    def get(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Return the resource stored under key, building it on first use"""
+        if key in self._resources:
+            return self._resources[key]
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._resources:
+                start = time.perf_counter()
+                resource = factory()
+                elapsed = time.perf_counter() - start
+                self.load_times[key] = elapsed
+                metrics.observe(f"resource_load.{key.split(':')[0]}", elapsed)
+                self._resources[key] = resource
+        return self._resources[key]
+
+    def lock(self, key: str) -> threading.Lock:
+        """Shared lock for serializing writes to a resource"""
+        with self._lock:
+            return self._write_locks.setdefault(key, threading.Lock())
+
+    def discard(self, key: str):
+        """Forget a resource so the next get() builds it again"""
+        with self._lock:
+            self._resources.pop(key, None)
+
+    def discard_prefix(self, prefix: str):
+        """Forget every resource whose key starts with prefix"""
+        with self._lock:
+            for key in [key for key in self._resources if key.startswith(prefix)]:
+                del self._resources[key]
+
+
+registry = ResourceRegistry()
+
+
+def get_embeddings(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = None):
+    """Shared embedding model behind the on-disk embedding cache"""
+    from embeddings import EMBEDDING_BACKEND, cache_name, create_embeddings
+    backend = backend or EMBEDDING_BACKEND
+
+    def load():
+        from embedding_cache import CachedEmbeddings, EmbeddingCache
+        return CachedEmbeddings(create_embeddings(model_name, backend), EmbeddingCache(cache_name(model_name, backend)))
+    return registry.get(f"embeddings:{model_name}:{backend}", load)
+
+
+def get_llm(api_key: str, model: str = DEFAULT_LLM_MODEL, endpoint: str = GEMINI_API_ENDPOINT):
+    """Shared Gemini chat client.
+
+    Retries are left to the LLMGateway in front of it. endpoint points the
+    client at another server, such as benchmarks/fake_llm_server.py.
+    """
+    def load():
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        kwargs = {"client_options": {"api_endpoint": endpoint}, "transport": "rest"} if endpoint else {}
+        return ChatGoogleGenerativeAI(model=model, google_api_key=api_key, max_retries=1, **kwargs)
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+    return registry.get(f"llm:{model}:{key_hash}:{endpoint}", load)
+
+
+def get_llm_gateway(llm):
+    """Shared gateway that caps, retries and coalesces the calls made to llm"""
+    def load():
+        from llm_gateway import LLMGateway
+        return LLMGateway(llm)
+    # The gateway keeps llm alive, so its id stays unique while registered
+    return registry.get(f"llm_gateway:{id(llm)}", load)
+
+
+def get_vector_store(persist_directory: str, model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = None,
+                     vector_backend: str = None):
+    """Shared vector store handle for a persist directory.
+
+    vector_backend is "chroma" or "mmap" (vector_index.MmapVectorStore).
+    The ingestion manifest does not record which one a directory was built
+    with, so switching needs a new persist directory or a fresh ingest.
+    """
+    from embeddings import EMBEDDING_BACKEND
+    backend = backend or EMBEDDING_BACKEND
+    vector_backend = vector_backend or VECTOR_BACKEND
+
+    def load():
+        if vector_backend == "mmap":
+            from vector_index import INDEX_DIRNAME, MmapVectorStore
+            return MmapVectorStore(os.path.join(persist_directory, INDEX_DIRNAME), get_embeddings(model_name, backend))
+        if vector_backend != "chroma":
+            raise ValueError(f"Unknown vector backend {vector_backend!r}, expected one of {', '.join(VECTOR_BACKENDS)}")
+        from langchain.vectorstores import Chroma
+        return Chroma(
+            persist_directory=persist_directory,
+            embedding_function=get_embeddings(model_name, backend)
+        )
+    return registry.get(f"vector_store:{persist_directory}:{model_name}:{backend}:{vector_backend}", load)
+
+
+def get_snapshot_store(snapshot_directory: str, model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = None):
+    """Shared read-only store of a snapshot exported by snapshot.py.
+
+    Raises snapshot.SnapshotMismatch if the snapshot was embedded with a
+    different model than the one this process would query it with.
+    """
+    from embeddings import EMBEDDING_BACKEND
+    backend = backend or EMBEDDING_BACKEND
+
+    def load():
+        from snapshot import check_fingerprint, embedding_fingerprint, read_snapshot_info
+        from vector_index import INDEX_DIRNAME, MmapVectorStore
+        embeddings = get_embeddings(model_name, backend)
+        info = read_snapshot_info(snapshot_directory)
+        check_fingerprint(info["embedding"], embedding_fingerprint(embeddings, model_name))
+        return MmapVectorStore(os.path.join(snapshot_directory, INDEX_DIRNAME), embeddings, read_only=True)
+    return registry.get(f"vector_store:{snapshot_directory}:{model_name}:{backend}:snapshot", load)
+
+
+def forget_chroma_client(persist_directory: str):
+    """Drop chromadb's cached client for persist_directory only.
+
+    chromadb shares one System per path, with the HNSW segments it already
+    loaded, so a new Chroma handle would not see what was written since.
+    The System is not stopped: handles still using it keep working until
+    their sessions reopen the store.
+    """
+    try:
+        from chromadb.api.client import SharedSystemClient
+    except ImportError:
+        return
+    systems = getattr(SharedSystemClient, "_identifer_to_system", None)
+    if systems is None:
+        return
+    for key in {persist_directory, os.path.abspath(persist_directory)}:
+        systems.pop(key, None)
+
+
+def reload_vector_stores(persist_directory: str):
+    """Reopen the store handles of a directory that was rewritten, e.g. by another process"""
+    registry.discard_prefix(f"vector_store:{persist_directory}:")
+    forget_chroma_client(persist_directory)
+    with registry._lock:
+        _store_generations[persist_directory] = _store_generations.get(persist_directory, 0) + 1
+
+
+_store_generations: Dict[str, int] = {}
+
+
+def store_generation(persist_directory: str) -> int:
+    """Number of times the handles of persist_directory were reopened; sessions compare it to drop theirs"""
+    return _store_generations.get(persist_directory, 0)
+
+
+def get_manifest(persist_directory: str) -> IngestionManifest:
+    """Shared ingestion manifest for a persist directory"""
+    return registry.get(f"manifest:{persist_directory}", lambda: IngestionManifest(persist_directory))
+
+
+def get_answer_cache():
+    """Shared cache of generated answers"""
+    def load():
+        from answer_cache import AnswerCache
+        return AnswerCache()
+    return registry.get("answer_cache", load)
+
+
+def get_python_worker_pool():
+    """Shared pool of warm Python interpreters, or None if disabled or unsupported"""
+    size = int(os.getenv("PYTHON_POOL_SIZE", "2"))
+    if size <= 0 or not hasattr(os, "fork"):
+        return None
+
+    def load():
+        from code_executor import PythonWorkerPool
+        return PythonWorkerPool(size=size, max_runs=int(os.getenv("PYTHON_POOL_MAX_RUNS", "50")))
+    return registry.get("python_worker_pool", load)
+
+
+def get_build_cache():
+    """Shared cache of compiled C++ and Java builds"""
+    def load():
+        from code_executor import BuildCache
+        return BuildCache()
+    return registry.get("build_cache", load)
+
+
+def get_execution_scheduler():
+    """Shared admission scheduler that runs every session's code executions"""
+    def load():
+        from code_executor import ExecutionScheduler, ResourceLimits, SafeCodeExecutor
+        limits = ResourceLimits(
+            cpu_seconds=int(os.getenv("EXECUTOR_CPU_SECONDS", "10")),
+            memory_bytes=int(os.getenv("EXECUTOR_MEMORY_MB", "512")) * 1024 * 1024,
+            max_processes=int(os.getenv("EXECUTOR_MAX_PROCESSES", "512"))
+        )
+        executor = SafeCodeExecutor(
+            python_pool=get_python_worker_pool(),
+            build_cache=get_build_cache(),
+            limits=limits
+        )
+        return ExecutionScheduler(executor)
+    return registry.get("execution_scheduler", load)
+
+
+def start_metrics_server(port: int = METRICS_PORT):
+    """Expose the process metrics at :port/metrics once; port 0 disables it"""
+    if not port:
+        return None
+    return registry.get(f"metrics_server:{port}", lambda: metrics.serve(port))
+
+
+def start_namespace_maintenance(persist_directory: str = None):
+    """Expire and compact namespaces, and compact persist_directory, in the background"""
+    from namespaces import NAMESPACE_MAINTENANCE_INTERVAL, start_maintenance
+    if NAMESPACE_MAINTENANCE_INTERVAL <= 0:
+        return None
+    directories = [persist_directory] if persist_directory else []
+    return registry.get("namespace_maintenance", lambda: start_maintenance(directories))
+
+
+def warm_up(api_key: str = None, persist_directory: str = None, background: bool = True,
+            snapshot_directory: str = None):
+    """Load the shared models once per process, before the first question arrives.
+
+    By default loading happens on a background thread so the first page
+    renders immediately; a session that needs a model before it is ready
+    simply waits for the same load. Set WARM_UP=0 to load only on demand.
+    The metrics endpoint is started here too when METRICS_PORT is set,
+    as is namespace maintenance. A snapshot_directory is opened instead of
+    persist_directory.
+    """
+    start_metrics_server()
+    start_namespace_maintenance(persist_directory)
+    if os.getenv("WARM_UP", "1") == "0":
+        return
+
+    def load():
+        get_embeddings()
+        if api_key:
+            get_llm(api_key)
+        if snapshot_directory:
+            try:
+                get_snapshot_store(snapshot_directory)
+            except Exception:
+                # The session that opens it reports the problem
+                pass
+        elif persist_directory:
+            get_vector_store(persist_directory)
+
+    def start():
+        if not background:
+            load()
+            return None
+        thread = threading.Thread(target=load, name="warm-up", daemon=True)
+        thread.start()
+        return thread
+    registry.get("warm_up", start)
+
+
+def load_metrics() -> Dict[str, float]:
+    """Seconds spent building each shared resource"""
+    return dict(registry.load_times)
+
+
+def embedding_cache_stats(model_name: str = DEFAULT_EMBEDDING_MODEL, backend: str = None) -> Dict[str, float]:
+    """Hit/miss statistics of the shared embedding cache"""
+    return get_embeddings(model_name, backend).cache.stats()
@@ -0,0 +1,170 @@
+"""Versioned, read-only snapshots of an ingested collection.
+
+A snapshot is a directory that can be opened as a persist directory of
+the mmap backend:
+
+    snapshot.json          format, version, chunk count, embedding fingerprint
+    ingest_manifest.json   the files and chunk ids it was built from
+    mmap_index/            vectors.f32, chunks.sqlite3 and, for large
+                           collections, hnsw.bin
+
+Export one from a built store, then point SNAPSHOT_DIRECTORY at it (or at
+a directory of snapshots, to use the newest):
+
+    python snapshot.py export --persist-directory ./chroma_db --output ./snapshots
+    python snapshot.py info ./snapshots
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Any, Dict, Optional
+
+from ingestion import IngestionManifest
+
+SNAPSHOT_FORMAT = 1
+SNAPSHOT_FILENAME = "snapshot.json"
+SNAPSHOT_DIRECTORY = os.getenv("SNAPSHOT_DIRECTORY", "")
+# Embedded to tell models apart beyond their names
+FINGERPRINT_PROBE = "def binary_search(items, target): return the index of target in a sorted list"
+# Probe vectors this similar come from the same model, e.g. its ONNX export
+FINGERPRINT_MIN_SIMILARITY = 0.99
+EXPORT_BATCH_SIZE = 1000
+
+
+class SnapshotMismatch(Exception):
+    """The snapshot was built with a different embedding model"""
+
+
+def embedding_fingerprint(embeddings, model_name: str) -> Dict[str, Any]:
+    """Model name, dimension and probe vector identifying an embedding model"""
+    import numpy as np
+    probe = np.asarray(embeddings.embed_query(FINGERPRINT_PROBE), dtype=np.float32)
+    probe /= max(float(np.linalg.norm(probe)), 1e-12)
+    return {
+        "model": model_name,
+        "dim": int(probe.shape[0]),
+        "probe": [round(float(x), 6) for x in probe],
+        "digest": hashlib.sha256(np.round(probe, 3).tobytes()).hexdigest()[:16],
+    }
+
+
+def check_fingerprint(expected: Dict[str, Any], actual: Dict[str, Any]):
+    """Raise SnapshotMismatch unless both fingerprints describe the same model"""
+    import numpy as np
+    if expected["model"] != actual["model"] or expected["dim"] != actual["dim"]:
+        raise SnapshotMismatch(
+            f"snapshot was built with {expected['model']} ({expected['dim']} dims), "
+            f"the app uses {actual['model']} ({actual['dim']} dims)"
+        )
+    similarity = float(np.dot(expected["probe"], actual["probe"]))
+    if similarity < FINGERPRINT_MIN_SIMILARITY:
+        raise SnapshotMismatch(f"embedding model weights differ from the snapshot's (probe similarity {similarity:.3f})")
+
+
+def resolve_snapshot(path: str) -> Optional[str]:
+    """path itself if it is a snapshot, else the newest snapshot directly inside it"""
+    if os.path.exists(os.path.join(path, SNAPSHOT_FILENAME)):
+        return path
+    try:
+        candidates = sorted(
+            entry.path for entry in os.scandir(path)
+            if entry.is_dir() and os.path.exists(os.path.join(entry.path, SNAPSHOT_FILENAME))
+        )
+    except OSError:
+        return None
+    return candidates[-1] if candidates else None
+
+
+def configured_snapshot() -> Optional[str]:
+    """The snapshot SNAPSHOT_DIRECTORY points at, if it is set and holds one"""
+    return resolve_snapshot(SNAPSHOT_DIRECTORY) if SNAPSHOT_DIRECTORY else None
+
+
+def read_snapshot_info(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, SNAPSHOT_FILENAME), encoding="utf-8") as f:
+        info = json.load(f)
+    if info.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} has snapshot format {info.get('format')}, expected {SNAPSHOT_FORMAT}")
+    return info
+
+
+def export_snapshot(store, manifest: IngestionManifest, embeddings, model_name: str, output: str) -> str:
+    """Write the chunks of a Chroma or mmap store into a new snapshot under output.
+
+    The snapshot is assembled in a temporary directory and renamed into
+    place, so readers never see a partial one. Returns its path.
+    """
+    from vector_index import INDEX_DIRNAME, MmapVectorStore, copy_chunks
+
+    version = manifest.version
+    name = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}-{version}"
+    final_path = os.path.join(output, name)
+    tmp_path = os.path.join(output, f".{name}.tmp")
+    os.makedirs(tmp_path)
+    try:
+        target = MmapVectorStore(os.path.join(tmp_path, INDEX_DIRNAME), embeddings)
+        chunks = copy_chunks(store, target, EXPORT_BATCH_SIZE)
+        target.trim()
+        # Build the ANN index now, if the collection is large enough, so replicas only load it
+        target._ensure_ann()
+        target.close()
+
+        # The copy starts with no deleted chunks, like the store it describes
+        copied = IngestionManifest(tmp_path)
+        copied.files = manifest.files
+        copied.save()
+        info = {
+            "format": SNAPSHOT_FORMAT,
+            "version": version,
+            "created": time.time(),
+            "chunks": chunks,
+            "files": len(manifest.files),
+            "embedding": embedding_fingerprint(embeddings, model_name),
+        }
+        with open(os.path.join(tmp_path, SNAPSHOT_FILENAME), "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return final_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and inspect vector store snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="snapshot a built persist directory")
+    export.add_argument("--persist-directory", default=os.getenv("PERSIST_DIRECTORY", "./chroma_db"))
+    export.add_argument("--vector-backend", help="backend the directory was built with, defaults to VECTOR_BACKEND")
+    export.add_argument("--backend", help="embedding backend, defaults to EMBEDDING_BACKEND")
+    export.add_argument("--output", default="./snapshots")
+
+    info = commands.add_parser("info", help="show a snapshot, or the newest one in a directory")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "info":
+        path = resolve_snapshot(args.path)
+        if path is None:
+            sys.exit(f"no snapshot in {args.path}")
+        details = read_snapshot_info(path)
+        details["embedding"] = {k: v for k, v in details["embedding"].items() if k != "probe"}
+        print(json.dumps({"path": path, **details}, indent=2))
+        return
+
+    from resources import DEFAULT_EMBEDDING_MODEL, get_embeddings, get_manifest, get_vector_store
+    manifest = get_manifest(args.persist_directory)
+    if not manifest.files:
+        sys.exit(f"nothing has been ingested into {args.persist_directory}")
+    store = get_vector_store(args.persist_directory, backend=args.backend, vector_backend=args.vector_backend)
+    path = export_snapshot(store, manifest, get_embeddings(backend=args.backend), DEFAULT_EMBEDDING_MODEL, args.output)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def profile_imports(module: str) -> Dict[str, float]:
+    """Seconds spent importing each top-level package when importing module.
+
+    Runs `python -X importtime` in a fresh interpreter so nothing is
+    already cached, and attributes each module's own import time to its
+    top-level package.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    per_package = defaultdict(float)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, _, _, name = match.groups()
+            per_package[name.split(".")[0]] += int(self_us) / 1e6
+    return dict(per_package)
+
+
+def profile_initialization() -> Dict[str, float]:
+    """Seconds spent building each shared resource the first time"""
+    from resources import get_build_cache, get_embeddings, get_execution_scheduler, load_metrics
+
+    timings = {}
+    for name, load in (
+        ("embeddings", get_embeddings),
+        ("execution_scheduler", get_execution_scheduler),
+        ("build_cache", get_build_cache),
+    ):
+        start = time.perf_counter()
+        try:
+            load()
+        except Exception as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            continue
+        timings[name] = time.perf_counter() - start
+    timings.update({f"registry.{key}": seconds for key, seconds in load_metrics().items()})
+    return timings
+
+
+def format_report(title: str, timings: Dict[str, float], top: int) -> List[str]:
+    lines = [title, "-" * len(title)]
+    ordered = sorted(timings.items(), key=lambda item: item[1], reverse=True)
+    for name, seconds in ordered[:top]:
+        lines.append(f"{seconds * 1000:10.1f} ms  {name}")
+    lines.append(f"{sum(timings.values()) * 1000:10.1f} ms  total")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Break down cold-start time of a Streamlit entry point")
+    parser.add_argument("module", nargs="?", default="combined_app", help="module to import, e.g. app")
+    parser.add_argument("--init", action="store_true", help="also load the shared models and executors")
+    parser.add_argument("--top", type=int, default=20, help="number of packages to list")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    report = {"module": args.module, "imports": profile_imports(args.module)}
+    if args.init:
+        report["initialization"] = profile_initialization()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print("\n".join(format_report(f"Import time for {args.module}", report["imports"], args.top)))
+    if args.init:
+        print()
+        print("\n".join(format_report("Initialization", report["initialization"], args.top)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import hashlib
+import multiprocessing
+
+import pytest
+
+pytest.importorskip("langchain")
+from embedding_cache import EmbeddingCache  # noqa: E402
+
+PUTS_PER_PROCESS = 300
+
+
+def vector_for(key):
+    return [b / 255 for b in hashlib.sha256(key.encode("utf-8")).digest()[:8]]
+
+
+def fill(directory, worker, capacity):
+    cache = EmbeddingCache("model", directory, capacity=capacity)
+    for i in range(PUTS_PER_PROCESS):
+        # Each batch has keys of its own and one the other process writes too
+        keys = [f"{worker}-{i}-{j}" for j in range(5)] + [f"shared-{i}"]
+        cache.put_many(keys, [vector_for(key) for key in keys])
+
+
+@pytest.mark.parametrize("capacity", [100000, 500])
+def test_processes_sharing_a_directory_keep_their_own_vectors(tmp_path, capacity):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=fill, args=(str(tmp_path), worker, capacity)) for worker in range(2)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    assert [process.exitcode for process in workers] == [0, 0]
+
+    cache = EmbeddingCache("model", str(tmp_path), capacity=capacity)
+    keys = [key for key, in cache._db.execute("SELECT key FROM entries")]
+    assert len(keys) == min(capacity, 2 * PUTS_PER_PROCESS * 5 + PUTS_PER_PROCESS)
+    for key, vector in zip(keys, cache.get_many(keys)):
+        assert vector == pytest.approx(vector_for(key))
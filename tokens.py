@@ -0,0 +1,21 @@
+import math
+
+# Gemini's tokenizer is only available through the API; English prose and
+# code average close to four characters per token, which is accurate
+# enough for budgeting prompts
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate number of tokens the model will count for text"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, at a word boundary where possible"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > max_chars // 2 else cut) + "…"
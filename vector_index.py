@@ -0,0 +1,400 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from langchain.vectorstores.base import VectorStore
+
+from metrics import metrics
+
+VECTOR_INDEX_ANN_THRESHOLD = int(os.getenv("VECTOR_INDEX_ANN_THRESHOLD", "50000"))
+INDEX_DIRNAME = "mmap_index"
+INITIAL_CAPACITY = 1024
+# hnswlib build and search parameters; ef_search trades recall for speed
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+class MmapVectorStore(VectorStore):
+    """Vector store kept as a memory-mapped float32 matrix in one directory.
+
+    Row i of vectors.f32 holds the normalized embedding of the chunk stored
+    under row i in the SQLite sidecar, next to its id, text and metadata.
+    Opening maps the file instead of loading it. Queries score every row
+    with one matrix product; above ann_threshold rows an hnswlib index is
+    used instead when hnswlib is installed. Deleted rows are only masked
+    out until the directory is rebuilt.
+
+    A read_only store maps the files without write access and rejects
+    changes; that is how snapshots are served (see snapshot.py).
+    """
+
+    def __init__(self, directory: str, embedding: Embeddings, ann_threshold: int = VECTOR_INDEX_ANN_THRESHOLD,
+                 read_only: bool = False):
+        self.directory = directory
+        self._embedding = embedding
+        self.ann_threshold = ann_threshold
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+        self.matrix_path = os.path.join(directory, "vectors.f32")
+        self.ann_path = os.path.join(directory, "hnsw.bin")
+        self._lock = threading.RLock()
+        self._matrix: Optional[np.memmap] = None
+        self._ann = None
+        self._ann_rows = 0
+
+        db_path = os.path.join(directory, "chunks.sqlite3")
+        if read_only:
+            self._db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS chunks (row INTEGER PRIMARY KEY, id TEXT UNIQUE, text TEXT, metadata TEXT)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+            self._db.commit()
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        self.dim = int(meta["dim"]) if "dim" in meta else None
+        # Rows below this have been handed out, alive or deleted
+        self.rows = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM chunks").fetchone()[0]
+        self._alive = np.zeros(0, dtype=bool)
+        if self.dim is not None:
+            self._open_matrix(max(self.rows, INITIAL_CAPACITY))
+            alive_rows = [row for (row,) in self._db.execute("SELECT row FROM chunks")]
+            self._alive[alive_rows] = True
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def _open_matrix(self, capacity: int):
+        """Map the matrix file, growing it to capacity rows; callers hold the lock"""
+        size = capacity * self.dim * np.dtype(np.float32).itemsize
+        if not self.read_only and (not os.path.exists(self.matrix_path) or os.path.getsize(self.matrix_path) < size):
+            with open(self.matrix_path, "ab") as f:
+                f.truncate(size)
+        capacity = os.path.getsize(self.matrix_path) // (self.dim * np.dtype(np.float32).itemsize)
+        mode = "r" if self.read_only else "r+"
+        self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+        alive = np.zeros(capacity, dtype=bool)
+        kept = min(capacity, len(self._alive))
+        alive[:kept] = self._alive[:kept]
+        self._alive = alive
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        """Embed and store texts; an existing id is replaced"""
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_vectors(self._embedding.embed_documents(texts), texts, metadatas, ids)
+
+    def add_vectors(self, vectors, texts: List[str], metadatas: Optional[List[dict]] = None,
+                    ids: Optional[List[str]] = None) -> List[str]:
+        """Store texts under embeddings computed elsewhere; an existing id is replaced"""
+        self._check_writable()
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [os.urandom(16).hex() for _ in texts]
+        vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (str(self.dim),))
+                self._open_matrix(INITIAL_CAPACITY)
+            self._delete_rows(ids)
+            if self.rows + len(texts) > len(self._matrix):
+                self._matrix.flush()
+                self._open_matrix(max(2 * len(self._matrix), self.rows + len(texts)))
+
+            rows = np.arange(self.rows, self.rows + len(texts))
+            self._matrix[rows] = vectors
+            self._db.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", [
+                (int(row), chunk_id, text, json.dumps(metadata))
+                for row, chunk_id, text, metadata in zip(rows, ids, texts, metadatas)
+            ])
+            self._db.commit()
+            self._alive[rows] = True
+            self.rows += len(texts)
+            if self._ann is not None:
+                self._add_to_ann()
+        return ids
+
+    def _check_writable(self):
+        if self.read_only:
+            raise PermissionError(f"{self.directory} is opened read-only")
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        self._check_writable()
+        with self._lock:
+            self._delete_rows(ids or [])
+            self._db.commit()
+        return True
+
+    def _delete_rows(self, ids: List[str]):
+        """Mask out the rows stored under ids; callers hold the lock and commit"""
+        rows = self._select("SELECT row FROM chunks WHERE id IN ({})", ids)
+        rows = [row for (row,) in rows]
+        if not rows:
+            return
+        self._db.executemany("DELETE FROM chunks WHERE row = ?", [(row,) for row in rows])
+        self._alive[rows] = False
+        if self._ann is not None:
+            for row in rows:
+                if row < self._ann_rows:
+                    self._ann.mark_deleted(row)
+
+    def _select(self, query: str, ids: List[str]) -> List[tuple]:
+        results = []
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            results.extend(self._db.execute(query.format(",".join("?" * len(batch))), batch).fetchall())
+        return results
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict[str, list]:
+        """Stored chunks in the shape Chroma's get() returns"""
+        include = ["documents", "metadatas"] if include is None else include
+        with self._lock:
+            if ids is None:
+                rows = self._db.execute("SELECT id, text, metadata, row FROM chunks ORDER BY row").fetchall()
+            else:
+                rows = self._select("SELECT id, text, metadata, row FROM chunks WHERE id IN ({})", list(ids))
+            if "embeddings" in include:
+                embeddings = [self._matrix[row[3]].tolist() for row in rows]
+        result = {"ids": [row[0] for row in rows]}
+        if "embeddings" in include:
+            result["embeddings"] = embeddings
+        if "documents" in include:
+            result["documents"] = [row[1] for row in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [json.loads(row[2]) for row in rows]
+        return result
+
+    def persist(self):
+        """Flush vectors to disk and save the ANN index if one was built"""
+        if self.read_only:
+            return
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._db.commit()
+            if self._ann is not None:
+                self._ann.save_index(self.ann_path)
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('ann_rows', ?)", (str(self._ann_rows),))
+                self._db.commit()
+
+    def trim(self):
+        """Shrink the matrix file to the rows handed out, dropping spare capacity"""
+        self._check_writable()
+        with self._lock:
+            if self._matrix is None or self.rows == 0:
+                return
+            self._matrix.flush()
+            self._matrix = None
+            os.truncate(self.matrix_path, self.rows * self.dim * np.dtype(np.float32).itemsize)
+            self._open_matrix(self.rows)
+
+    def close(self):
+        """Flush and release the files; the store cannot be used afterwards"""
+        self.persist()
+        with self._lock:
+            self._matrix = None
+            self._ann = None
+            self._db.close()
+
+    def _ensure_ann(self) -> bool:
+        """Build or load the hnswlib index once the store passes the threshold"""
+        if self._ann is not None:
+            return True
+        if len(self) < self.ann_threshold:
+            return False
+        try:
+            import hnswlib
+        except ImportError:
+            # Still correct, but every query scans all rows
+            metrics.increment("vector_index.ann_unavailable")
+            return False
+        with self._lock:
+            if self._ann is not None:
+                return True
+            index = hnswlib.Index(space="ip", dim=self.dim)
+            saved_rows = self._db.execute("SELECT value FROM meta WHERE name = 'ann_rows'").fetchone()
+            with metrics.timer("vector_index.ann_build"):
+                if saved_rows and os.path.exists(self.ann_path) and int(saved_rows[0]) <= self.rows:
+                    index.load_index(self.ann_path, max_elements=len(self._matrix))
+                    self._ann_rows = int(saved_rows[0])
+                    for row in np.flatnonzero(~self._alive[:self._ann_rows]):
+                        try:
+                            index.mark_deleted(int(row))
+                        except RuntimeError:
+                            pass
+                else:
+                    index.init_index(max_elements=len(self._matrix), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+                    self._ann_rows = 0
+                index.set_ef(HNSW_EF_SEARCH)
+                self._ann = index
+                self._add_to_ann()
+        return True
+
+    def _add_to_ann(self):
+        """Insert rows added since the index was last extended; callers hold the lock"""
+        if self._ann.get_max_elements() < len(self._matrix):
+            self._ann.resize_index(len(self._matrix))
+        new_rows = np.flatnonzero(self._alive[self._ann_rows:self.rows]) + self._ann_rows
+        if len(new_rows):
+            self._ann.add_items(np.asarray(self._matrix[new_rows]), new_rows)
+        self._ann_rows = self.rows
+
+    def _search(self, vector: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """(row, cosine similarity) of the k best rows"""
+        if self.dim is None or k <= 0 or not self._alive.any():
+            return []
+        if self._ensure_ann():
+            with self._lock:
+                k = min(k, len(self))
+                labels, distances = self._ann.knn_query(vector, k=k)
+            return [(int(row), 1.0 - float(distance)) for row, distance in zip(labels[0], distances[0])]
+
+        with self._lock:
+            matrix, alive, rows = self._matrix, self._alive, self.rows
+        scores = np.asarray(matrix[:rows]) @ vector
+        scores[~alive[:rows]] = -np.inf
+        k = min(k, int(alive[:rows].sum()))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row), float(scores[row])) for row in top]
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        with metrics.timer("vector_index.search"):
+            hits = self._search(vector, k)
+        if not hits:
+            return []
+        with self._lock:
+            found = {row: (text, metadata) for row, text, metadata in self._select(
+                "SELECT row, text, metadata FROM chunks WHERE row IN ({})", [row for row, _ in hits]
+            )}
+        return [
+            (Document(page_content=found[row][0], metadata=json.loads(found[row][1])), score)
+            for row, score in hits if row in found
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, persist_directory: str = "./chroma_db",
+                   **kwargs: Any) -> "MmapVectorStore":
+        store = cls(os.path.join(persist_directory, INDEX_DIRNAME), embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        store.persist()
+        return store
+
+
+class CombinedVectorStore(VectorStore):
+    """Read-only view that searches several stores and merges their best hits.
+
+    The query is embedded once; each store returns its k best chunks and
+    the k most similar of those are kept. Hits are ranked by the cosine
+    similarity of their stored embeddings, since the relevance scores of
+    Chroma and of mmap stores are on different scales.
+    """
+
+    def __init__(self, stores: List[VectorStore]):
+        self.stores = list(stores)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self.stores[0].embeddings
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, **kwargs: Any) -> List[str]:
+        raise NotImplementedError("add texts to one of the combined stores")
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        """(doc, cosine similarity) of the k best chunks across all stores"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector /= max(float(np.linalg.norm(vector)), 1e-12)
+        hits = []
+        for store in self.stores:
+            if isinstance(store, MmapVectorStore):
+                hits.extend(store.similarity_search_by_vector_with_score(vector, k))
+            else:
+                hits.extend(_chroma_cosine_search(store, vector, k))
+        hits.sort(key=lambda hit: hit[1], reverse=True)
+        return hits[:k]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k)
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]
+        return lambda score: (score + 1.0) / 2.0
+
+    def similarity_search_with_relevance_scores(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        relevance = self._select_relevance_score_fn()
+        return [(doc, relevance(score)) for doc, score in self.similarity_search_with_score(query, k)]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "CombinedVectorStore":
+        raise NotImplementedError("combine existing stores instead")
+
+
+def _chroma_cosine_search(store, vector: np.ndarray, k: int) -> List[Tuple[Document, float]]:
+    """(doc, cosine similarity) of the k nearest chunks of a Chroma store, scored from their stored embeddings"""
+    result = store._collection.query(query_embeddings=[vector.tolist()], n_results=k,
+                                     include=["documents", "metadatas", "embeddings"])
+    if not result["ids"] or not len(result["ids"][0]):
+        return []
+    scores = normalize_rows(np.asarray(result["embeddings"][0], dtype=np.float32)) @ vector
+    return [
+        (Document(page_content=text, metadata=metadata or {}), float(score))
+        for text, metadata, score in zip(result["documents"][0], result["metadatas"][0], scores)
+    ]
+
+
+def copy_chunks(source: VectorStore, target: VectorStore, batch_size: int = 1000) -> int:
+    """Copy the live chunks of a Chroma or mmap store into target with their stored embeddings.
+
+    Returns the number copied. Deleted chunks are left behind, so copying
+    into an empty store is how a fragmented one is rebuilt.
+    """
+    ids = source.get(include=[])["ids"]
+    for start in range(0, len(ids), batch_size):
+        batch = source.get(ids=ids[start:start + batch_size], include=["embeddings", "documents", "metadatas"])
+        vectors = np.asarray(batch["embeddings"], dtype=np.float32)
+        if isinstance(target, MmapVectorStore):
+            target.add_vectors(vectors, batch["documents"], batch["metadatas"], batch["ids"])
+        else:
+            target._collection.upsert(ids=batch["ids"], embeddings=vectors.tolist(),
+                                      documents=batch["documents"], metadatas=batch["metadatas"])
+    return len(ids)